@@ -1,5 +1,6 @@
 import sys
 import os
+import argparse
 
 # 將 src 加入 path 以便 import
 sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
@@ -7,18 +8,34 @@ sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
 from src.fetcher import StockFetcher
 from src.processor import DataProcessor
 from src.validator import MinerviniValidator, ReportGenerator
+from src.profiling import StageProfiler
+from src.checkpoint import RunCheckpoint
 
-def main():
+def _notify(progress, stage, **info):
+    """回報目前執行階段 (progress 為 None 時不做任何事)"""
+    if progress is not None:
+        progress(stage, **info)
+
+def main(progress=None, profile=None):
+    """
+    執行完整選股流程
+    progress: 選填的回呼函式 progress(stage, **info)，用來回報各階段進度 (供 server 推播)
+    profile: 是否啟用分階段效能剖析 (None 表示依環境變數 MTTS_PROFILE 決定)
+    回傳: 與 results.json 相同結構的 dict (metadata + data)，失敗時回傳 None
+    """
     print("=== Minervini Trend Template Screener (MTTS) 啟動 ===")
     
     # 1. 初始化模組
-    fetcher = StockFetcher()
+    fetcher = StockFetcher(progress=progress)
     processor = DataProcessor()
     validator = MinerviniValidator()
     reporter = ReportGenerator()
+    profiler = StageProfiler(enabled=profile)
     
     # 2. 獲取清單 (Universe) - 這裡會回傳 {代號: 名稱} 的 Dictionary
-    tickers_map = fetcher.get_universe()
+    _notify(progress, "universe")
+    with profiler.stage("universe"):
+        tickers_map = fetcher.get_universe()
     
     # 轉換為列表供下載用
     ticker_list = list(tickers_map.keys())
@@ -27,29 +44,46 @@ def main():
     # 如果要跑全市場，請註解掉下面這行
     # ticker_list = ticker_list[:500]
     
+    # 建立 (或恢復) 本次執行的檢查點，中斷後重跑會從最後完成的批次/分片繼續
+    RunCheckpoint.cleanup_stale()
+    checkpoint = RunCheckpoint(ticker_list)
+
     # 3. 獲取數據 (Fetch)
-    raw_data = fetcher.fetch_batch(ticker_list)
+    with profiler.stage("fetch"):
+        raw_data = fetcher.fetch_batch(ticker_list, checkpoint=checkpoint)
     
     if raw_data is None or raw_data.empty:
         print("無法獲取數據，程式終止。")
-        return
+        _notify(progress, "failed", message="無法獲取數據")
+        profiler.write_summary()
+        return None
 
     # 4. 處理數據與計算指標 (Process & RS)
-    stock_map = processor.process_data(raw_data, ticker_list)
+    _notify(progress, "process", total=len(ticker_list))
+    with profiler.stage("process"):
+        stock_map = processor.process_data(raw_data, ticker_list, fetcher.industry_map, checkpoint=checkpoint)
     
-    # 5. 驗證策略 (Validate)
-    results = []
+    # 5. 驗證策略 (Validate) - 以篩選規格對整個快照一次判定
     print("正在執行策略驗證...")
-    for ticker, df in stock_map.items():
-        # 從 map 中獲取中文名稱，若找不到則給空字串
-        stock_name = tickers_map.get(ticker, "")
-        
-        # 傳入 ticker, name, df
-        res = validator.validate(ticker, stock_name, df)
-        results.append(res)
+    _notify(progress, "validate", total=len(stock_map))
+    with profiler.stage("validate"):
+        snapshot = processor.build_snapshot(stock_map)
+        results = validator.validate_snapshot(snapshot, tickers_map, fetcher.industry_map)
+        processor.save_snapshot(snapshot, tickers_map, fetcher.industry_map)
         
     # 6. 生成報告 (Report)
-    reporter.generate(results)
+    _notify(progress, "report")
+    with profiler.stage("report"):
+        output_data = reporter.generate(results, validator.screens)
+        reporter.generate_quality_report(fetcher.quality_report)
+
+    checkpoint.mark_complete()
+    profiler.write_summary()
+    return output_data
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Minervini Trend Template Screener")
+    parser.add_argument("--profile", action="store_true", default=None,
+                        help="啟用分階段效能剖析 (輸出至 backend/profiles/)")
+    args = parser.parse_args()
+    main(profile=args.profile)
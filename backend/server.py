@@ -1,35 +1,97 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
+from pydantic import BaseModel
 from apscheduler.schedulers.background import BackgroundScheduler
 import uvicorn
+import asyncio
+import json
 import os
 import threading
 import datetime
 
-# 引入核心邏輯
-import main 
 from src import config
+from src.events import EventBroker, diff_results, format_sse
+from src.exporter import available_columns, filter_results, iter_csv
+from src.rules import ScreenSpecError
+from src.watchlist import WatchlistScreener
+from src.worker import run_pipeline_isolated
 
 # === 設定全域變數 ===
 OUTPUT_DIR = config.OUTPUT_DIR
 if not os.path.exists(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR)
 
-def run_screener_task():
-    """執行選股邏輯的包裝函式"""
+SSE_KEEPALIVE_SECONDS = 15
+
+# 事件廣播器 + 目前記憶體中的最新結果 (以 ticker 為 key，用於計算差異)
+broker = EventBroker()
+latest_results = {}
+run_lock = threading.Lock()  # 同一時間只允許一次選股流程
+watchlist = WatchlistScreener()  # 自選清單即時篩選 (使用最新指標快照)
+
+def set_latest_results(rows):
+    """整份替換 (不就地修改)，讓正在串流匯出的請求繼續使用舊的那份"""
+    global latest_results
+    latest_results = {row["ticker"]: row for row in rows}
+
+def load_latest_results():
+    """啟動時從 results.json 載入上一次的結果"""
+    json_path = os.path.join(OUTPUT_DIR, "results.json")
+    if not os.path.exists(json_path):
+        return
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            output_data = json.load(f)
+        set_latest_results(output_data.get("data", []))
+    except Exception as e:
+        print(f"⚠️ 無法載入既有結果: {e}")
+
+def publish_results(output_data):
+    """與上一次結果比對，只推送有變動的列"""
+    changed, removed = diff_results(latest_results, output_data["data"])
+    set_latest_results(output_data["data"])
+    broker.publish("results", {
+        "metadata": output_data["metadata"],
+        "changed": changed,
+        "removed": removed,
+    })
+    print(f"📡 已推送結果差異：變動 {len(changed)} 檔，移除 {len(removed)} 檔")
+
+def run_screener_task(profile=None):
+    """
+    執行選股邏輯的包裝函式 (profile=None 時依環境變數 MTTS_PROFILE 決定是否剖析)
+    流程在獨立子程序中執行，API 程序只接收精簡的結果，記憶體與請求延遲不受影響
+    """
+    if not run_lock.acquire(blocking=False):
+        print("⚠️ 選股流程已在執行中，略過本次觸發。")
+        return
     print(f"[{datetime.datetime.now()}] ⏰ 排程啟動：開始執行選股策略...")
     try:
-        main.main()
+        output_data = run_pipeline_isolated(progress=broker.progress_callback, profile=profile)
+        if output_data is None:
+            return
+        broker.progress_callback("done")
+        publish_results(output_data)
+        watchlist.load()
         print(f"[{datetime.datetime.now()}] ✅ 排程完成：數據已更新")
     except Exception as e:
+        broker.progress_callback("failed", message=str(e))
         print(f"❌ 執行失敗: {e}")
+    finally:
+        run_lock.release()
 
 # === 定義生命週期 (Lifespan) ===
 # 這裡控制 Server 啟動和關閉時要做的事
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # 0. 綁定事件廣播器並載入既有結果
+    broker.bind(asyncio.get_running_loop())
+    load_latest_results()
+    watchlist.load()
+
     # 1. 啟動排程器
     scheduler = BackgroundScheduler()
     # 設定每天下午 15:00 (台股收盤後) 自動執行
@@ -69,11 +131,84 @@ app.mount("/data", StaticFiles(directory=OUTPUT_DIR), name="data")
 
 # 2. 手動觸發 API
 @app.post("/update")
-def trigger_update():
-    thread = threading.Thread(target=run_screener_task)
+def trigger_update(profile: bool | None = None):
+    if run_lock.locked():
+        return {"status": "Update running", "message": "An update is already in progress, subscribe to /events for progress."}
+    thread = threading.Thread(target=run_screener_task, kwargs={"profile": profile})
     thread.start()
     return {"status": "Update started", "message": "Backend is updating data in background..."}
 
+# 3. 執行進度與結果差異推播 (Server-Sent Events)
+@app.get("/events")
+async def stream_events(request: Request):
+    queue = broker.subscribe()
+
+    async def event_stream():
+        try:
+            # 連線時先送出目前狀態，讓晚加入的前端也知道是否正在更新
+            yield format_sse("status", {"running": run_lock.locked(), "progress": broker.last_progress})
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                    yield message
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            broker.unsubscribe(queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# 4. 依需求串流匯出 CSV (直接從記憶體中的結果逐列輸出，不建立中間資料表)
+@app.get("/export")
+def export_results(
+    format: str = Query("csv", pattern="^(csv|excel)$"),
+    columns: str | None = None,
+    status: str | None = Query(None, pattern="^(PASS|FAIL)$"),
+    min_rs: int | None = None,
+    industry: str | None = None,
+    screen: str | None = None,
+):
+    rows = list(latest_results.values())
+    if not rows:
+        raise HTTPException(status_code=404, detail="No results yet, run /update first.")
+
+    valid_columns = available_columns(rows)
+    selected = [c.strip() for c in columns.split(",") if c.strip()] if columns else valid_columns
+    unknown = [c for c in selected if c not in valid_columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail={"unknown_columns": unknown, "available": valid_columns})
+
+    excel = format == "excel"
+    filtered = filter_results(rows, status=status, min_rs=min_rs, industry=industry, screen=screen)
+    filename = f"mtts_{datetime.datetime.now().strftime('%Y%m%d')}{'_excel' if excel else ''}.csv"
+    return StreamingResponse(
+        iter_csv(filtered, selected, excel=excel),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+# 5. 自選清單即時篩選 (使用快取的指標快照，不觸發下載)
+class ScreenRequest(BaseModel):
+    tickers: list[str]
+    overrides: dict[str, float] = {}
+
+@app.post("/screen")
+def screen_watchlist(request: ScreenRequest):
+    try:
+        return watchlist.screen(request.tickers, request.overrides)
+    except LookupError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ScreenSpecError as e:
+        # 未知的參數覆寫
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError as e:
+        # 自選清單超過單次上限
+        raise HTTPException(status_code=422, detail=str(e))
+
 @app.get("/")
 def read_root():
     return {
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+from datetime import datetime
+from . import config
+
+
+def _atomic_write(path, write_fn, mode="wb"):
+    """先寫入暫存檔並 fsync，再以 os.replace 換上，程序中途被殺也不會留下半個檔案"""
+    tmp_path = f"{path}.tmp"
+    encoding = None if "b" in mode else "utf-8"
+    with open(tmp_path, mode, encoding=encoding) as f:
+        write_fn(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class RunCheckpoint:
+    """
+    單次執行的檢查點 (cache/runs/<日期>_<清單雜湊>/)
+    每個完成的單位 (下載批次、運算分片) 各存一個 pickle，並記錄在 manifest.json
+    同一天、同一份股票清單重跑時，已完成的單位直接載入，不再重新下載或運算
+    (下載批次若仍有重試用盡的股票，payload 中的 pending 會列出，續跑時只重抓這些)
+    """
+
+    def __init__(self, tickers, run_date=None):
+        run_date = run_date or datetime.now().strftime('%Y-%m-%d')
+        digest = hashlib.sha1("\n".join(tickers).encode("utf-8")).hexdigest()[:10]
+        self.run_id = f"{run_date}_{digest}"
+        self.run_dir = os.path.join(config.CHECKPOINT_DIR, self.run_id)
+        self.manifest_path = os.path.join(self.run_dir, "manifest.json")
+        os.makedirs(self.run_dir, exist_ok=True)
+        self.manifest = self._load_manifest(len(tickers))
+
+        done = len(self.manifest["units"])
+        if done and self.manifest["status"] != "complete":
+            print(f"♻️ 發現未完成的執行檢查點 {self.run_id}：已完成 {done} 個單位，將從中斷處繼續。")
+
+    def _load_manifest(self, ticker_count):
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"⚠️ 檢查點 manifest 讀取失敗，將重新開始: {e}")
+        now = datetime.now().isoformat()
+        return {
+            "run_id": self.run_id,
+            "status": "running",
+            "created": now,
+            "updated": now,
+            "tickers": ticker_count,
+            "units": {},
+        }
+
+    def _write_manifest(self):
+        self.manifest["updated"] = datetime.now().isoformat()
+        _atomic_write(
+            self.manifest_path,
+            lambda f: json.dump(self.manifest, f, ensure_ascii=False, indent=2),
+            mode="w",
+        )
+
+    def _unit_path(self, unit):
+        return os.path.join(self.run_dir, f"{unit}.pkl")
+
+    def has(self, unit):
+        return unit in self.manifest["units"] and os.path.exists(self._unit_path(unit))
+
+    def load(self, unit):
+        with open(self._unit_path(unit), "rb") as f:
+            return pickle.load(f)
+
+    def save(self, unit, payload, **meta):
+        """寫入單位資料後才更新 manifest，確保 manifest 中列出的單位一定可以載入"""
+        _atomic_write(self._unit_path(unit), lambda f: pickle.dump(payload, f))
+        self.manifest["units"][unit] = {"saved_at": datetime.now().isoformat(), **meta}
+        self._write_manifest()
+
+    def mark_complete(self):
+        """整個流程完成：刪除各單位檔案 (已由當日快取與輸出取代)，保留 manifest 作為紀錄"""
+        for unit in list(self.manifest["units"]):
+            path = self._unit_path(unit)
+            if os.path.exists(path):
+                os.remove(path)
+        self.manifest["status"] = "complete"
+        self._write_manifest()
+
+    @staticmethod
+    def cleanup_stale(keep_date=None):
+        """刪除非今日的檢查點目錄"""
+        keep_date = keep_date or datetime.now().strftime('%Y-%m-%d')
+        if not os.path.isdir(config.CHECKPOINT_DIR):
+            return
+        for name in os.listdir(config.CHECKPOINT_DIR):
+            if not name.startswith(keep_date):
+                shutil.rmtree(os.path.join(config.CHECKPOINT_DIR, name), ignore_errors=True)
@@ -4,7 +4,11 @@ import os
 # 獲取當前檔案 (src/config.py) 的上一層目錄作為 BASE_DIR (即 backend/)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 CACHE_DIR = os.path.join(BASE_DIR, "cache")
+CHECKPOINT_DIR = os.path.join(CACHE_DIR, "runs")   # 可續跑的執行檢查點
+SNAPSHOT_PATH = os.path.join(CACHE_DIR, "indicator_snapshot.pkl")  # 最新指標快照 (供自選清單即時篩選)
 OUTPUT_DIR = os.path.join(BASE_DIR, "output")
+PROFILE_DIR = os.path.join(BASE_DIR, "profiles")
+SCREENS_DIR = os.path.join(BASE_DIR, "screens")
 
 # 確保目錄存在
 os.makedirs(CACHE_DIR, exist_ok=True)
@@ -14,11 +18,44 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 RS_THRESHOLD = 70               # 相對強度需大於 70 (前 30%)
 MIN_AVG_VOLUME_SHARES = 500000  # 最小 20日均量 (500張)
 IPO_MIN_DAYS = 250              # 最小上市天數 (排除新股)
+GROUP_MIN_MEMBERS = 3           # 產業族群至少 3 檔有效個股才計算族群 RS
+
+# === 篩選規格 (screens/*.json，門檻以 $參數名 引用本檔設定) ===
+PRIMARY_SCREEN = "minervini"    # 決定 status / details 的主要篩選規格
+WATCHLIST_MAX_TICKERS = 300     # /screen 單次最多檢查 300 檔
 
 # === 技術型態參數 (參照 PRD FR-04) ===
 DIST_FROM_LOW_THRESHOLD = 1.30  # 需高於 52週低點 30%
 DIST_FROM_HIGH_THRESHOLD = 0.75 # 需在 52週最高點 25% 範圍內 (1 - 0.25)
 MA_SLOPE_LOOKBACK = 22          # 判斷 200MA 斜率的回看天數 (約1個月)
 
+# === VCP 波動收縮型態 ===
+VCP_LOOKBACK = 120              # 基底觀察期 (約半年)
+VCP_SEGMENT_BARS = 20           # 每段 20 根 K 棒 (約一個月)，觀察期共 6 段
+VCP_MIN_CONTRACTIONS = 2        # 至少 2 次遞減的回檔才算 VCP
+VCP_MAX_FINAL_DEPTH = 0.10      # 最後一次收縮的回檔需在 10% 以內
+VCP_MIN_PULLBACK = 0.01         # 回檔不到 1% (僅是單日震幅) 不算一次收縮
+VCP_VOLUME_DRYUP_RATIO = 0.70   # 最後一段均量低於基底均量 70% 視為量縮
+
+# === 歷史資料庫 (增量更新) ===
+HISTORY_DAYS = 1000             # 保留約 3 年日曆天的歷史
+INCREMENTAL_OVERLAP_DAYS = 10   # 增量下載與資料庫重疊 10 個日曆天，用來比對除權息調整
+RESTATEMENT_TOLERANCE = 1e-4    # 重疊區間價格或調整因子相對變動超過此值即重抓完整歷史
+
+# === 資料品質檢查 (逐檔) ===
+QUALITY_MIN_HISTORY = 250       # 至少要有 250 筆有效收盤價，否則視為截斷 (需重抓)
+QUALITY_LISTING_COVERAGE = 0.85 # 上市未滿一年的新股：有效 K 棒達上市以來平日數的 85% 即可 (扣除國定假日)
+QUALITY_MAX_STALE_BARS = 3      # 最後交易日落後整批最新日期超過 3 根 K 棒視為過期 (需重抓)
+QUALITY_MAX_NAN_GAP = 10        # 上市期間連續缺值超過 10 天 (可能停牌或資料缺漏)
+QUALITY_MAX_ZERO_VOLUME = 10    # 連續零成交量超過 10 天
+QUALITY_MAX_DAILY_JUMP = 0.25   # 單日價格變動超過 25% (台股漲跌幅限制 10%，超過多半是資料異常)
+
 # === 系統效能 ===
-MAX_WORKERS = 16                # 資料下載並發執行緒數量
\ No newline at end of file
+MAX_WORKERS = 16                # 資料下載並發執行緒數量
+PROCESS_SHARD_SIZE = 300        # 指標運算每 300 檔存一次檢查點
+WORKER_START_METHOD = "spawn"   # 選股流程在獨立子程序執行 (server 有多個執行緒，不使用 fork)
+
+# === 效能剖析 (預設關閉，main.py --profile 或設定環境變數 MTTS_PROFILE=1 啟用) ===
+PROFILE_ENV_VAR = "MTTS_PROFILE"
+PROFILE_TOP_N = 30              # 熱點函式與記憶體配置各列出前 30 名
+PROFILE_TRACEBACK_DEPTH = 1     # tracemalloc 記錄的呼叫堆疊深度 (越深越慢)
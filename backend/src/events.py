@@ -0,0 +1,80 @@
+import asyncio
+import json
+import threading
+from datetime import datetime, timezone, timedelta
+
+# 每個連線最多暫存的事件數，慢速客戶端超過時丟棄最舊的事件
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def format_sse(event_type, data):
+    """轉成 text/event-stream 格式"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event_type}\ndata: {payload}\n\n"
+
+
+def diff_results(old_rows, new_rows):
+    """
+    比對前後兩次的結果列 (以 ticker 為 key)
+    回傳: (有變動或新增的列, 已移除的 ticker 清單)
+    """
+    new_tickers = set()
+    changed = []
+    for row in new_rows:
+        ticker = row["ticker"]
+        new_tickers.add(ticker)
+        if old_rows.get(ticker) != row:
+            changed.append(row)
+    removed = [t for t in old_rows if t not in new_tickers]
+    return changed, removed
+
+
+class EventBroker:
+    """
+    將背景執行緒 (排程、手動更新) 的事件廣播給所有 SSE 連線
+    publish 可在任何執行緒呼叫；訂閱端為 event loop 上的 asyncio.Queue
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.last_progress = None
+
+    def bind(self, loop):
+        """綁定 server 的 event loop (於 lifespan 啟動時呼叫)"""
+        self._loop = loop
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers.discard(queue)
+
+    def publish(self, event_type, data):
+        if event_type == "progress":
+            self.last_progress = data
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._dispatch, event_type, data)
+
+    def progress_callback(self, stage, **info):
+        """給 main.main(progress=...) 使用的回呼"""
+        tw_tz = timezone(timedelta(hours=8))
+        self.publish("progress", {"stage": stage, "time": datetime.now(tw_tz).isoformat(), **info})
+
+    def _dispatch(self, event_type, data):
+        message = format_sse(event_type, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for queue in subscribers:
+            if queue.full():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            queue.put_nowait(message)
@@ -0,0 +1,90 @@
+import csv
+import io
+
+# 固定欄位：欄位名稱 -> 從結果 dict 取值 (與過去 results.csv 的欄位一致)
+BASE_COLUMNS = {
+    "Ticker": lambda res: res['ticker'],
+    "Name": lambda res: res['name'],
+    "Price": lambda res: res['price'],
+    "Status": lambda res: res['status'],
+    "Reason": lambda res: res['fail_reason'],
+    "Score": lambda res: res['match_count'],
+    "RS": lambda res: res['rs_rating'],
+    "Industry": lambda res: res.get('industry', ""),
+    "Group_ROC": lambda res: res.get('group_roc'),
+    "Group_RS": lambda res: res.get('group_rs'),
+    "Group_Rank": lambda res: res.get('group_rank', 0),
+    "Volume_Avg": lambda res: res['vol_avg'],
+    "Dist_Low": lambda res: res['dist_low_pct'],
+    "Dist_High": lambda res: res['dist_high_pct'],
+}
+
+ROWS_PER_CHUNK = 200   # 每累積 200 列送出一次
+
+
+def _column_getter(column):
+    """
+    動態欄位：條件細節 (c1_trend_stack)、指標 (SMA_50)、VCP_xxx、<screen>_status / <screen>_score
+    """
+    if column in BASE_COLUMNS:
+        return BASE_COLUMNS[column]
+    if column.startswith("VCP_"):
+        key = column[len("VCP_"):]
+        return lambda res: res.get('vcp', {}).get(key, "")
+    for suffix in ("_status", "_score"):
+        if column.endswith(suffix):
+            screen, field = column[:-len(suffix)], suffix[1:]
+            return lambda res: res.get('screens', {}).get(screen, {}).get(field, "")
+    return lambda res: res['details'].get(column, res['indicators'].get(column, ""))
+
+
+def available_columns(results):
+    """依第一筆結果列出所有可匯出的欄位 (順序同過去的 results.csv)"""
+    if not results:
+        return list(BASE_COLUMNS)
+    first = results[0]
+    columns = list(BASE_COLUMNS) + list(first['details']) + list(first['indicators'])
+    columns += [f"VCP_{k}" for k in first.get('vcp', {})]
+    for screen in first.get('screens', {}):
+        columns += [f"{screen}_status", f"{screen}_score"]
+    return columns
+
+
+def filter_results(results, status=None, min_rs=None, industry=None, screen=None):
+    """逐列過濾 (generator，不建立中間資料表)"""
+    for res in results:
+        if status and res['status'] != status:
+            continue
+        if min_rs is not None and res['rs_rating'] < min_rs:
+            continue
+        if industry and res.get('industry') != industry:
+            continue
+        if screen and res.get('screens', {}).get(screen, {}).get('status') != "PASS":
+            continue
+        yield res
+
+
+def iter_csv(results, columns, excel=False):
+    """
+    將結果逐批轉成 CSV 文字送出
+    excel=True 時開頭加上 UTF-8 BOM，讓 Excel 直接開啟時中文不會變亂碼
+    """
+    getters = [_column_getter(c) for c in columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    if excel:
+        buffer.write("\ufeff")
+    writer.writerow(columns)
+
+    pending = 0
+    for res in results:
+        writer.writerow([get(res) for get in getters])
+        pending += 1
+        if pending >= ROWS_PER_CHUNK:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+
+    yield buffer.getvalue()
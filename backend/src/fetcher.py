@@ -7,17 +7,27 @@ import time
 import random
 from datetime import datetime, timedelta
 from . import config
+from .panel import ensure_multi_index, field_panel, select_tickers
+from .quality import DataQualityChecker
 
 class StockFetcher:
-    def __init__(self):
-        self.cache_path = os.path.join(config.CACHE_DIR, f"market_data_{datetime.now().strftime('%Y-%m-%d')}.pkl")
+    def __init__(self, progress=None):
+        self.store_path = os.path.join(config.CACHE_DIR, "market_data_store.pkl")  # 跨日累積的歷史資料庫
+        self.checker = DataQualityChecker()
+        self.quality_report = None
+        self.progress = progress  # 選填：progress(stage, **info) 進度回呼
+        self.industry_map = {}    # get_universe 時一併記錄 {代號: 產業類別}
+        self.listing_dates = {}   # get_universe 時一併記錄 {代號: 上市日期}，用於區分新股與被截斷的歷史
+        self.restated = []        # 本次偵測到還原價被改寫、重抓完整歷史的股票
 
     def get_universe(self):
         """
-        取得台股上市櫃普通股清單
+        取得台股上市櫃普通股清單 (產業類別、上市日期另存於 self.industry_map、self.listing_dates)
         """
         print("正在獲取股票代碼與名稱清單...")
         tickers_map = {}
+        self.industry_map = {}
+        self.listing_dates = {}
         
         for code, info in twstock.codes.items():
             if info.type == "股票":
@@ -32,50 +42,152 @@ class StockFetcher:
                 
                 if full_code:
                     tickers_map[full_code] = info.name
+                    self.industry_map[full_code] = info.group
+                    if info.start:
+                        self.listing_dates[full_code] = info.start.replace("/", "-")
         
         print(f"共取得 {len(tickers_map)} 檔普通股代碼。")
         return tickers_map
 
-    def fetch_batch(self, tickers):
+    def fetch_batch(self, tickers, checkpoint=None):
         """
-        分批下載 (包含資料長度檢查，防止 Yahoo 給截斷的數據)
+        取得全市場日線資料 (增量模式，並偵測除權息造成的還原價改寫)
+        - 有歷史資料庫：只下載最近幾天，比對重疊區間的調整因子，僅對被改寫的股票重抓完整歷史
+        - 沒有歷史資料庫：分批下載完整歷史
+        checkpoint: 選填的 RunCheckpoint，每完成一批即存檔，重跑時跳過已完成的批次
+        """
+        self.restated = []
+
+        # 1. 檢查資料庫：今天已更新過就直接使用
+        store = self._load_store()
+        if store is not None and self._store_date() == datetime.now().date():
+            print(f"發現今日已更新的資料庫，正在載入：{self.store_path}")
+            final_data = select_tickers(store, tickers)
+            self._build_quality_report(final_data, tickers)
+            return final_data
+
+        # 設定起始日期 (強制抓 3 年)
+        start_date = (datetime.now() - timedelta(days=config.HISTORY_DAYS)).strftime('%Y-%m-%d')
+
+        if store is None:
+            # 2a. 無資料庫，執行完整分批下載
+            print(f"開始下載 {len(tickers)} 檔股票數據 (完整模式)...")
+            all_dfs, refetched, unresolved = self._download_batches(tickers, start_date, checkpoint, phase="full")
+        else:
+            # 2b. 增量更新：只抓最近的 K 棒
+            stored = set(store.columns.get_level_values(0))
+            known = [t for t in tickers if t in stored]
+            new_tickers = [t for t in tickers if t not in stored]
+
+            # 資料庫中歷史長度不足的股票 (依上市日判斷，真正的新股不算)：直接重抓完整歷史
+            store_report = self.checker.check(store, tickers=known, listing_dates=self.listing_dates)
+            truncated = store_report.index[store_report['truncated']].tolist()
+            truncated_set = set(truncated)
+            incremental = [t for t in known if t not in truncated_set]
+
+            recent_start = (store.index.max() - timedelta(days=config.INCREMENTAL_OVERLAP_DAYS)).strftime('%Y-%m-%d')
+            print(f"開始增量更新 {len(incremental)} 檔股票數據 (自 {recent_start} 起)...")
+            recent_dfs, refetched, recent_unresolved = self._download_batches(
+                incremental, recent_start, checkpoint, phase="recent", check_history=False
+            )
+            recent = pd.concat(recent_dfs, axis=1) if recent_dfs else None
+
+            # 3. 比對重疊區間：調整因子或原始價格變動的股票需重抓完整歷史
+            self.restated = self._detect_restatements(store, recent, incremental)
+            received = set(recent.columns.get_level_values(0)) if recent is not None else set()
+            missing = [t for t in incremental if t not in received or t in recent_unresolved]
+            redownload = list(dict.fromkeys(self.restated + truncated + new_tickers + missing))
+            if self.restated:
+                print(f"♻️ 偵測到 {len(self.restated)} 檔除權息或資料修正，重新下載完整歷史。")
+
+            full_dfs, unresolved = [], set()
+            if redownload:
+                print(f"重新下載 {len(redownload)} 檔完整歷史 (改寫 {len(self.restated)}、歷史不足 {len(truncated)}、"
+                      f"新增 {len(new_tickers)}、缺漏 {len(missing)})...")
+                full_dfs, full_refetched, unresolved = self._download_batches(redownload, start_date, checkpoint, phase="restate")
+                refetched |= full_refetched
+
+            # 未受影響的股票：沿用資料庫歷史，接上最新 K 棒
+            redownload_set = set(redownload)
+            keep = [t for t in incremental if t not in redownload_set]
+            all_dfs = full_dfs
+            if keep:
+                merged = select_tickers(recent, keep).combine_first(select_tickers(store, keep))
+                all_dfs = [merged] + full_dfs
+
+        if not all_dfs:
+            print("❌ 所有批次下載皆失敗，無法產生數據。")
+            return None
+
+        # 4. 合併數據與儲存
+        print("\n下載完成，正在合併數據...")
+        try:
+            final_data = pd.concat(all_dfs, axis=1)
+            final_data = final_data[final_data.index >= start_date].dropna(how='all')
+            self._build_quality_report(final_data, tickers, refetched)
+            
+            # 重試用盡仍不合格的股票不寫入資料庫 (下次執行視為新股重抓完整歷史)
+            print("正在寫入資料庫...")
+            if unresolved:
+                print(f"   ⚠️ {len(unresolved)} 檔數據不完整，暫不寫入資料庫。")
+            self._save_store(final_data.loc[:, ~final_data.columns.get_level_values(0).isin(list(unresolved))])
+                
+            return final_data
+            
+        except Exception as e:
+            print(f"數據合併失敗: {e}")
+            return None
+
+    def _download_batches(self, tickers, start_date, checkpoint, phase, check_history=True):
+        """
+        分批下載 (逐檔資料品質檢查，只重抓被 Yahoo 截斷或過期的股票)
+        回傳: (各批次 DataFrame 清單, 曾經重抓的 ticker 集合, 重試用盡仍不合格的 ticker 集合)
         """
-        # 1. 檢查快取
-        if os.path.exists(self.cache_path):
-            print(f"發現今日快取，正在載入：{self.cache_path}")
-            try:
-                with open(self.cache_path, "rb") as f:
-                    return pickle.load(f)
-            except Exception as e:
-                print(f"快取讀取失敗，將重新下載: {e}")
-
-        # 2. 無快取，執行分批下載
-        print(f"開始下載 {len(tickers)} 檔股票數據 (完整模式)...")
-        
         # === 參數設定 ===
         BATCH_SIZE = 500       # 保持小批次
         NORMAL_DELAY_MIN = 0  # 正常等待
         NORMAL_DELAY_MAX = 2
-        ERROR_COOLDOWN = 60   # 遇到長度不足或封鎖，休息 1 分鐘
+        ERROR_COOLDOWN = 60   # 整批都被截斷或封鎖，休息 1 分鐘
+        SOFT_BAN_RATIO = 0.5  # 原批次過半數不合格才判定為流量限制 (少數幾檔沒資料多半是停牌或下市)
+        SOFT_BAN_MIN_FAILED = 5  # 且至少 5 檔不合格 (避免小批次因一兩檔就長時冷卻)
         MAX_RETRIES = 3
-        MIN_HISTORY_LEN = 250 # 關鍵：至少要有 250 天的資料才算成功
-        
-        # 設定起始日期 (強制抓 3 年)
-        start_date = (datetime.now() - timedelta(days=1000)).strftime('%Y-%m-%d')
         
         all_dfs = []
+        refetched = set()
+        unresolved = set()
         chunks = [tickers[i:i + BATCH_SIZE] for i in range(0, len(tickers), BATCH_SIZE)]
         total_batches = len(chunks)
         
         for i, chunk in enumerate(chunks):
             current_batch = i + 1
             print(f"[{current_batch}/{total_batches}] 正在下載 {len(chunk)} 檔...", end="", flush=True)
-            
-            success = False
+            if self.progress is not None:
+                self.progress("fetch", phase=phase, batch=current_batch, total=total_batches)
+
+            batch_dfs = []          # 本批已取得合格數據的部分
+            batch_refetched = set()
+            pending = list(chunk)   # 本批尚未取得合格數據的股票
+
+            unit = f"fetch_{phase}_batch_{current_batch:03d}"
+            if checkpoint is not None and checkpoint.has(unit):
+                saved = checkpoint.load(unit)
+                batch_dfs = list(saved["frames"])
+                batch_refetched = set(saved["refetched"])
+                pending = saved.get("pending", [])
+                if not pending:
+                    all_dfs.extend(batch_dfs)
+                    refetched.update(batch_refetched)
+                    print(" ♻️ 從檢查點載入。")
+                    continue
+                # 上次重試用盡仍不合格的股票 (例如被流量限制截斷)：只重抓這些
+                print(f" ♻️ 從檢查點載入，重抓上次未完成的 {len(pending)} 檔...", end="", flush=True)
+
+            fallback = None         # 重試用盡時，保留最後一次取得的 (不合格) 數據
+            prev_report = None
             for attempt in range(MAX_RETRIES):
                 try:
                     data = yf.download(
-                        chunk, 
+                        pending, 
                         start=start_date, # 強制指定起始日
                         threads=False,    # 關閉多線程以穩定數據
                         group_by='ticker',
@@ -83,28 +195,52 @@ class StockFetcher:
                         progress=False    # 關閉 yfinance 內建進度條以免洗版
                     )
                     
-                    if not data.empty:
-                        # === 關鍵檢查：資料長度夠嗎？ ===
-                        # 取出這批資料的列數 (天數)
-                        data_len = len(data)
-                        
-                        if data_len < MIN_HISTORY_LEN:
-                            # 資料太短！判定為 Yahoo 截斷數據 (Soft Ban)
-                            print(f"\n   ⚠️ 警告：資料長度不足 ({data_len} 天 < {MIN_HISTORY_LEN} 天)。判定為流量限制截斷。")
-                            raise ValueError("Data truncated by Yahoo (Soft Ban)")
-                        
-                        # 成功
-                        all_dfs.append(data)
-                        success = True
-                        
+                    if data.empty:
+                        if prev_report is not None and (prev_report['valid_bars'] == 0).all():
+                            # 剩下的股票上次也完全沒有資料 (停牌、下市)，視為最終結果
+                            batch_dfs.append(fallback)
+                            pending = []
+                            print(" ✅ 完成 (其餘股票無資料)。")
+                            break
+                        print(f"\n   ⚠️ 無數據 (Attempt {attempt+1})。")
+                        time.sleep(10)
+                        continue
+
+                    data = ensure_multi_index(data, pending)
+
+                    # === 關鍵檢查：逐檔檢查長度與最後日期 ===
+                    report = self.checker.check(data, tickers=pending, check_history=check_history,
+                                                listing_dates=self.listing_dates)
+                    failed = self.checker.refetch_tickers(report)
+
+                    if prev_report is not None:
+                        # 重抓後筆數與最後日期都沒變 (含兩次都沒有資料)：視為真實狀況 (新上市、停牌、下市)，不再重抓
+                        failed = [t for t in failed if self._changed_on_refetch(report, prev_report, t)]
+
+                    passed = [t for t in pending if t not in failed]
+                    if passed:
+                        batch_dfs.append(select_tickers(data, passed))
+
+                    if not failed:
+                        pending = []
                         # 隨機延遲
                         sleep_time = random.uniform(NORMAL_DELAY_MIN, NORMAL_DELAY_MAX)
-                        print(f" ✅ 成功 ({data_len} 天)。休息 {sleep_time:.1f}s...")
+                        print(f" ✅ 成功 ({len(data)} 天)。休息 {sleep_time:.1f}s...")
                         time.sleep(sleep_time)
-                        break 
-                    else:
-                        print(f"\n   ⚠️ 無數據 (Attempt {attempt+1})。")
-                        time.sleep(10)
+                        break
+
+                    fallback = select_tickers(data, failed)
+                    prev_report = report.loc[failed]
+                    batch_refetched.update(failed)
+                    pending = failed
+
+                    if len(failed) >= max(SOFT_BAN_MIN_FAILED, SOFT_BAN_RATIO * len(chunk)):
+                        # 原批次大半不合格！判定為 Yahoo 截斷數據 (Soft Ban)
+                        print(f"\n   ⚠️ 警告：{len(failed)}/{len(chunk)} 檔資料截斷或過期。判定為流量限制截斷。")
+                        raise ValueError("Data truncated by Yahoo (Soft Ban)")
+
+                    print(f"\n   ⚠️ {len(failed)} 檔資料截斷或過期，只重抓這些股票 (Attempt {attempt+1})...", end="", flush=True)
+                    time.sleep(random.uniform(NORMAL_DELAY_MIN, NORMAL_DELAY_MAX))
                         
                 except Exception as e:
                     error_msg = str(e)
@@ -116,24 +252,81 @@ class StockFetcher:
                         print(f"\n   ❌ 失敗: {error_msg}。重試中...")
                         time.sleep(15)
             
-            if not success:
-                print(f"\n   ❌ 第 {current_batch} 批完全失敗 (已達重試上限)，跳過。")
+            # 檢查點只存合格的數據：仍有未完成股票的批次記為部分完成，續跑時只重抓 pending
+            if checkpoint is not None and batch_dfs:
+                checkpoint.save(unit, {"frames": batch_dfs, "refetched": sorted(batch_refetched), "pending": pending},
+                                tickers=len(chunk), unresolved=len(pending), complete=not pending)
 
-        if not all_dfs:
-            print("❌ 所有批次下載皆失敗，無法產生數據。")
-            return None
+            all_dfs.extend(batch_dfs)
+            refetched.update(batch_refetched)
 
-        # 3. 合併數據與儲存
-        print("\n下載完成，正在合併數據...")
+            if pending:
+                print(f"\n   ❌ 第 {current_batch} 批有 {len(pending)} 檔已達重試上限，保留最後一次取得的數據並記錄於品質報告。")
+                unresolved.update(pending)
+                if fallback is not None:
+                    all_dfs.append(fallback)
+
+        return all_dfs, refetched, unresolved
+
+    @staticmethod
+    def _changed_on_refetch(report, prev_report, ticker):
+        """重抓後有效筆數或最後日期是否改變 (沒有資料時 last_date 為空值，兩次皆空視為相同)"""
+        if report.at[ticker, 'valid_bars'] != prev_report.at[ticker, 'valid_bars']:
+            return True
+        last, prev_last = report.at[ticker, 'last_date'], prev_report.at[ticker, 'last_date']
+        if pd.isna(last) and pd.isna(prev_last):
+            return False
+        return last != prev_last
+
+    def _detect_restatements(self, store, recent, tickers):
+        """
+        比對資料庫與最新下載在重疊日期上的價格 (向量化)
+        調整因子 (Adj Close / Close) 改變 = 發生除權息或分割，整段還原價都會被改寫
+        原始收盤價改變 = Yahoo 修正歷史資料
+        回傳: 需要重抓完整歷史的 ticker 清單
+        """
+        if recent is None or not tickers:
+            return []
+        overlap = store.index.intersection(recent.index)
+        if overlap.empty:
+            return []
+
+        old_close = field_panel(store, 'Close').reindex(index=overlap, columns=tickers)
+        new_close = field_panel(recent, 'Close').reindex(index=overlap, columns=tickers)
+        old_adj = field_panel(store, 'Adj Close').reindex(index=overlap, columns=tickers)
+        new_adj = field_panel(recent, 'Adj Close').reindex(index=overlap, columns=tickers)
+
+        factor_change = ((new_adj / new_close) / (old_adj / old_close) - 1).abs()
+        close_change = (new_close / old_close - 1).abs()
+        tolerance = config.RESTATEMENT_TOLERANCE
+        restated = (factor_change > tolerance).any(axis=0) | (close_change > tolerance).any(axis=0)
+        return restated.index[restated].tolist()
+
+    def _load_store(self):
+        if not os.path.exists(self.store_path):
+            return None
         try:
-            final_data = pd.concat(all_dfs, axis=1)
-            
-            print("正在寫入快取...")
-            with open(self.cache_path, "wb") as f:
-                pickle.dump(final_data, f)
-                
-            return final_data
-            
+            with open(self.store_path, "rb") as f:
+                return pickle.load(f)
         except Exception as e:
-            print(f"數據合併失敗: {e}")
-            return None
\ No newline at end of file
+            print(f"資料庫讀取失敗，將重新下載完整歷史: {e}")
+            return None
+
+    def _store_date(self):
+        return datetime.fromtimestamp(os.path.getmtime(self.store_path)).date()
+
+    def _save_store(self, final_data):
+        """寫入暫存檔後再替換，避免寫到一半中斷造成資料庫毀損"""
+        tmp_path = f"{self.store_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(final_data, f)
+        os.replace(tmp_path, self.store_path)
+
+    def _build_quality_report(self, final_data, tickers, refetched=None):
+        """對合併後的整個面板做最終品質檢查，結果存放於 self.quality_report"""
+        report = self.checker.check(final_data, tickers=tickers, listing_dates=self.listing_dates)
+        self.quality_report = self.checker.summarize(report, sorted(refetched or []))
+        self.quality_report["restated"] = sorted(self.restated)
+        self.quality_report["summary"]["restated"] = len(self.restated)
+        summary = self.quality_report["summary"]
+        print(f"資料品質檢查：{summary['checked']} 檔中有 {summary['flagged']} 檔異常 (重抓 {summary['refetched']} 檔)。")
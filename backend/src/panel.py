@@ -0,0 +1,36 @@
+import pandas as pd
+
+
+def field_panel(raw_data, field):
+    """
+    從 yf.download(group_by='ticker') 的多層欄位資料中，取出單一欄位的寬表
+    回傳: index 為日期、columns 為 ticker 的 DataFrame (找不到欄位時回傳 None)
+    """
+    if raw_data is None or raw_data.empty:
+        return None
+    if not isinstance(raw_data.columns, pd.MultiIndex):
+        return None
+    if field not in raw_data.columns.get_level_values(1):
+        return None
+    return raw_data.xs(field, axis=1, level=1)
+
+
+def price_panel(raw_data):
+    """取出價格寬表：優先使用 Adj Close，沒有則退回 Close (與 DataProcessor 一致)"""
+    panel = field_panel(raw_data, 'Adj Close')
+    if panel is None:
+        panel = field_panel(raw_data, 'Close')
+    return panel
+
+
+def select_tickers(raw_data, tickers):
+    """只保留指定 ticker 的欄位 (保留原本的多層欄位結構)"""
+    mask = raw_data.columns.get_level_values(0).isin(list(tickers))
+    return raw_data.loc[:, mask]
+
+
+def ensure_multi_index(data, tickers):
+    """單檔下載時 yfinance 可能回傳單層欄位，這裡統一包成 (ticker, field) 結構"""
+    if isinstance(data.columns, pd.MultiIndex) or len(tickers) != 1:
+        return data
+    return pd.concat({tickers[0]: data}, axis=1)
@@ -1,14 +1,34 @@
+import os
+import pickle
 import pandas as pd
 import numpy as np
+from datetime import datetime
 from . import config
+from .vcp import VCPDetector
+
+def _percentile_rating(values):
+    """
+    將數值轉為 0-99 的百分位評分：贏過 (含平手) 多少比例的樣本
+    NaN 不參與排名，評分為 0
+    """
+    valid_count = values.notna().sum()
+    if valid_count == 0:
+        return pd.Series(0, index=values.index, dtype=int)
+    ratings = values.rank(method='max') / valid_count * 99
+    return ratings.fillna(0).astype(int)
+
 
 class DataProcessor:
-    def process_data(self, raw_data, tickers):
+    def __init__(self):
+        self.vcp_detector = VCPDetector()
+
+    def process_data(self, raw_data, tickers, industry_map=None, checkpoint=None):
         """
-        執行 ETL 流程：清洗 -> 計算個股指標 -> 計算 RS 排名
+        執行 ETL 流程：清洗 -> 計算個股指標 -> 計算 RS 排名 (全市場 + 產業族群) -> VCP 偵測
+        industry_map: 選填 {ticker: 產業類別}，用於計算族群 RS
+        checkpoint: 選填的 RunCheckpoint，指標運算分片完成即存檔
         """
         processed_stocks = {}
-        valid_rocs = [] 
 
         print(f"開始處理 {len(tickers)} 檔股票數據...")
 
@@ -20,6 +40,51 @@ class DataProcessor:
         # 判斷是否為多層索引 (MultiIndex)
         is_multi_index = isinstance(raw_data.columns, pd.MultiIndex)
 
+        # === 1-3. 個股指標運算 (分片進行，每片完成即存檔，可從中斷處續跑) ===
+        shard_size = config.PROCESS_SHARD_SIZE
+        shards = [tickers[i:i + shard_size] for i in range(0, len(tickers), shard_size)]
+        for k, shard in enumerate(shards):
+            unit = f"process_shard_{k + 1:03d}"
+            if checkpoint is not None and checkpoint.has(unit):
+                print(f"♻️ 第 {k + 1}/{len(shards)} 片指標從檢查點載入。")
+                processed_stocks.update(checkpoint.load(unit))
+                continue
+
+            shard_stocks = self._compute_indicators(raw_data, shard, is_multi_index, len(tickers) == 1)
+            processed_stocks.update(shard_stocks)
+            if checkpoint is not None:
+                checkpoint.save(unit, shard_stocks, tickers=len(shard))
+
+        # === 4. RS 排名運算 (Pass 2，橫斷面向量化) ===
+        rankings = self.rank_strength(processed_stocks, industry_map or {})
+        print(f"正在計算 RS 評分 (有效樣本數: {int(rankings['Weighted_ROC'].notna().sum())})...")
+
+        if rankings['Weighted_ROC'].notna().sum() == 0:
+            print("❌ 警告：沒有任何有效的 ROC 數據，RS 評分將全為 0。")
+
+        for ticker, df in processed_stocks.items():
+            df['RS_Rating'] = rankings.at[ticker, 'RS_Rating']
+            df['Group_ROC'] = rankings.at[ticker, 'Group_ROC']
+            df['Group_RS'] = rankings.at[ticker, 'Group_RS']
+            df['Group_Rank'] = rankings.at[ticker, 'Group_Rank']
+
+        # === 5. VCP 型態偵測 (全市場面板一次計算) ===
+        print("正在偵測 VCP 波動收縮型態...")
+        vcp = self.vcp_detector.detect(raw_data, list(processed_stocks.keys()))
+        for ticker, df in processed_stocks.items():
+            if ticker in vcp.index:
+                for col, val in vcp.loc[ticker].items():
+                    df[col] = val
+
+        return processed_stocks
+
+    def _compute_indicators(self, raw_data, tickers, is_multi_index, single_ticker):
+        """
+        逐檔清洗並計算技術指標 (均線、52週高低、加權 ROC)
+        回傳: {ticker: 含指標的 DataFrame}
+        """
+        processed_stocks = {}
+
         for ticker in tickers:
             try:
                 # === 1. 資料提取與欄位標準化 ===
@@ -32,7 +97,7 @@ class DataProcessor:
                     df = raw_data[ticker].copy()
                 else:
                     # 單一股票的情況 (很少見，但以防萬一)
-                    if len(tickers) == 1:
+                    if single_ticker:
                         df = raw_data.copy()
                     else:
                         continue
@@ -104,11 +169,6 @@ class DataProcessor:
                 # 但更嚴謹的做法是若資料不足 252 天，權重應重新分配 (這裡先簡化處理)
                 df['Weighted_ROC'] = (0.4 * roc_3m) + (0.2 * roc_6m) + (0.2 * roc_9m) + (0.2 * roc_12m)
                 
-                # 存入結果 (改用 Weighted_ROC)
-                current_roc = df['Weighted_ROC'].iloc[-1]
-                if not pd.isna(current_roc):
-                    valid_rocs.append(current_roc)
-
 
                 # === [DEBUG] 檢查算出來的結果 ===
                 if ticker == "2330.TW":
@@ -118,46 +178,76 @@ class DataProcessor:
                     if pd.isna(df['SMA_200'].iloc[-1]):
                         print("   ❌ [嚴重] SMA_200 計算結果為 NaN！(可能歷史資料長度剛好卡邊緣)")
                 
-                # 收集有效的 ROC 用於後續排名
-                current_roc = df['Weighted_ROC'].iloc[-1]
-                if not pd.isna(current_roc):
-                    valid_rocs.append(current_roc)
-                
                 processed_stocks[ticker] = df
 
             except Exception as e:
                 print(f"⚠️ 處理 {ticker} 時發生錯誤: {e}")
                 continue
 
-        # === 4. RS 排名運算 (Pass 2) ===
-        print(f"正在計算 RS 評分 (有效樣本數: {len(valid_rocs)})...")
-        
-        if not valid_rocs:
-            print("❌ 警告：沒有任何有效的 ROC 數據，RS 評分將全為 0。")
-            return processed_stocks
+        return processed_stocks
 
-        # 將 list 轉為 Series 以便大量運算
-        roc_series = pd.Series(valid_rocs).sort_values()
-        
-        for ticker, df in processed_stocks.items():
-            try:
-                current_roc = df['Weighted_ROC'].iloc[-1]
-                
-                if pd.isna(current_roc):
-                    df['RS_Rating'] = 0
-                else:
-                    # 使用 percentileofscore 或是簡單的 rank 邏輯
-                    # 這裡使用簡單邏輯：贏過多少百分比的人
-                    # searchsorted 回傳的是「如果插入這個值，會排在第幾個索引」
-                    # 索引位置 / 總數 = 百分比
-                    rank_idx = roc_series.searchsorted(current_roc, side='right')
-                    percentile = (rank_idx / len(roc_series)) * 99
-                    df['RS_Rating'] = int(percentile)
-                
-                processed_stocks[ticker] = df
-                
-            except Exception:
-                df['RS_Rating'] = 0
-                processed_stocks[ticker] = df
+    def rank_strength(self, processed_stocks, industry_map):
+        """
+        以每檔最新的 Weighted_ROC 建立橫斷面快照，一次算出：
+        - RS_Rating: 全市場百分位 (0-99)
+        - Group_ROC: 所屬產業族群的平均 Weighted_ROC
+        - Group_RS: Group_ROC 在所有族群中的百分位 (0-99)
+        - Group_Rank: 個股在所屬族群內的百分位 (0-99)
+        沒有產業類別或族群成員不足而未排名者，Group_ROC / Group_RS 為 NaN (與最弱族群的 0 區分)
+        """
+        tickers = list(processed_stocks.keys())
+        snapshot = pd.DataFrame({
+            'Weighted_ROC': [df['Weighted_ROC'].iloc[-1] for df in processed_stocks.values()],
+            'Industry': [industry_map.get(t) or None for t in tickers],
+        }, index=tickers)
 
-        return processed_stocks
\ No newline at end of file
+        snapshot['RS_Rating'] = _percentile_rating(snapshot['Weighted_ROC'])
+
+        grouped = snapshot.dropna(subset=['Industry', 'Weighted_ROC']).groupby('Industry')['Weighted_ROC']
+
+        # 族群強度：成員數不足的族群不列入排名 (避免 1-2 檔就代表整個族群)
+        group_stats = grouped.agg(['mean', 'count'])
+        group_roc = group_stats['mean'].where(group_stats['count'] >= config.GROUP_MIN_MEMBERS)
+        group_rs = _percentile_rating(group_roc).where(group_roc.notna())
+        snapshot['Group_ROC'] = snapshot['Industry'].map(group_roc)
+        snapshot['Group_RS'] = snapshot['Industry'].map(group_rs)
+
+        # 族群內排名
+        group_size = grouped.transform('count')
+        intra_rank = grouped.rank(method='max') / group_size * 99
+        snapshot['Group_Rank'] = intra_rank.reindex(snapshot.index).fillna(0).astype(int)
+
+        return snapshot
+
+    def build_snapshot(self, processed_stocks):
+        """
+        取每檔最新一筆資料組成橫斷面快照 (index 為 ticker，每列一檔)
+        Price 欄位：優先 Adj Close，沒有則使用 Close (與指標計算一致)
+        """
+        if not processed_stocks:
+            return pd.DataFrame(columns=['Price'])
+
+        snapshot = pd.DataFrame([df.iloc[-1] for df in processed_stocks.values()],
+                                index=list(processed_stocks.keys()))
+        snapshot = snapshot.apply(pd.to_numeric, errors='coerce')
+        if 'Adj Close' in snapshot.columns:
+            snapshot['Price'] = snapshot['Adj Close']
+        else:
+            snapshot['Price'] = snapshot['Close']
+        return snapshot
+
+    def save_snapshot(self, snapshot, names, industries):
+        """
+        將指標快照連同名稱、產業寫入 cache (先寫暫存檔再替換)
+        供 API 對自選清單即時篩選，不需重新下載或運算
+        """
+        payload = {
+            "timestamp": datetime.now().isoformat(),
+            "snapshot": snapshot,
+            "names": {t: names.get(t, "") for t in snapshot.index},
+            "industries": {t: industries.get(t, "") for t in snapshot.index},
+        }
+        tmp_path = f"{config.SNAPSHOT_PATH}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(payload, f)
+        os.replace(tmp_path, config.SNAPSHOT_PATH)
@@ -0,0 +1,114 @@
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from . import config
+
+
+def profiling_requested(flag=None):
+    """明確指定的 flag 優先，否則讀取環境變數 (MTTS_PROFILE=1)"""
+    if flag is not None:
+        return bool(flag)
+    return os.environ.get(config.PROFILE_ENV_VAR, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+class StageProfiler:
+    """
+    分階段效能剖析：每個階段各自輸出 CPU profile (.pstats) 與記憶體配置快照
+    未啟用時 stage() 直接 yield，不建立任何 profiler，幾乎沒有額外開銷
+    """
+
+    def __init__(self, enabled=None):
+        self.enabled = profiling_requested(enabled)
+        self.run_dir = None
+        self.stages = []
+        if self.enabled:
+            run_id = datetime.now().strftime('%Y%m%d-%H%M%S')
+            self.run_dir = os.path.join(config.PROFILE_DIR, run_id)
+            os.makedirs(self.run_dir, exist_ok=True)
+            print(f"🔬 效能剖析模式已啟用，輸出目錄：{self.run_dir}")
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(config.PROFILE_TRACEBACK_DEPTH)
+        tracemalloc.reset_peak()
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            self._save_stage(name, profiler, snapshot, elapsed, current, peak)
+
+    def _save_stage(self, name, profiler, snapshot, elapsed, current, peak):
+        prefix = os.path.join(self.run_dir, f"{len(self.stages) + 1:02d}_{name}")
+
+        # 1. CPU profile：可直接用 snakeviz / flameprof / gprof2dot 開啟
+        profiler.dump_stats(f"{prefix}.pstats")
+
+        # 2. 熱點函式 (依累計時間與自身時間各取前 N 名)
+        buffer = io.StringIO()
+        stats = pstats.Stats(profiler, stream=buffer).strip_dirs()
+        stats.sort_stats("cumulative").print_stats(config.PROFILE_TOP_N)
+        stats.sort_stats("tottime").print_stats(config.PROFILE_TOP_N)
+        with open(f"{prefix}_hot.txt", "w", encoding="utf-8") as f:
+            f.write(buffer.getvalue())
+
+        # 3. 記憶體配置熱點 (依程式行統計)
+        top_allocs = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        )).statistics("lineno")[:config.PROFILE_TOP_N]
+        with open(f"{prefix}_alloc.txt", "w", encoding="utf-8") as f:
+            for stat in top_allocs:
+                f.write(f"{stat}\n")
+
+        self.stages.append({
+            "stage": name,
+            "seconds": elapsed,
+            "current_mb": current / 1024 / 1024,
+            "peak_mb": peak / 1024 / 1024,
+            "top_function": self._top_function(stats),
+        })
+        print(f"🔬 [{name}] {elapsed:.2f}s，峰值記憶體 {peak / 1024 / 1024:.1f} MB")
+
+    @staticmethod
+    def _top_function(stats):
+        """取出自身時間最高的函式 (file:line(func))"""
+        if not stats.stats:
+            return ""
+        (filename, line, func), values = max(stats.stats.items(), key=lambda item: item[1][2])
+        return f"{filename}:{line}({func}) {values[2]:.3f}s"
+
+    def write_summary(self):
+        """輸出各階段總覽 summary.txt"""
+        if not self.enabled or not self.stages:
+            return
+        total = sum(s["seconds"] for s in self.stages)
+        lines = [f"{'stage':<12}{'seconds':>10}{'share':>8}{'peak_mb':>10}  top self-time function"]
+        for s in self.stages:
+            share = s["seconds"] / total * 100 if total else 0
+            lines.append(f"{s['stage']:<12}{s['seconds']:>10.2f}{share:>7.1f}%{s['peak_mb']:>10.1f}  {s['top_function']}")
+        lines.append(f"{'total':<12}{total:>10.2f}")
+
+        summary_path = os.path.join(self.run_dir, "summary.txt")
+        with open(summary_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        print(f"🔬 效能剖析報告已輸出：{summary_path}")
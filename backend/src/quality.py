@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+from . import config
+from .panel import field_panel, price_panel
+
+# 會觸發重新下載的問題 (通常是 Yahoo 截斷或回傳舊資料)
+REFETCH_FLAGS = ["truncated", "stale"]
+# 只記錄、不重抓的問題 (重抓多半也一樣，交給使用者判讀)
+WARNING_FLAGS = ["nan_gap", "zero_volume", "price_jump"]
+
+
+def _longest_run(mask):
+    """
+    計算布林矩陣 (日期 x 股票) 每一欄最長的連續 True 長度 (向量化，不逐檔迴圈)
+    """
+    if mask.shape[0] == 0:
+        return np.zeros(mask.shape[1], dtype=int)
+    counts = np.cumsum(mask, axis=0)
+    # 遇到 False 時記下當下累計值，之後的連續長度 = 累計值 - 最近一次重置點
+    resets = np.where(~mask, counts, 0)
+    resets = np.maximum.accumulate(resets, axis=0)
+    return (counts - resets).max(axis=0)
+
+
+class DataQualityChecker:
+    def check(self, raw_data, tickers=None, check_history=True, listing_dates=None):
+        """
+        對整批下載的面板資料做逐檔品質檢查 (截斷、過期、缺值、零量、異常跳動)
+        listing_dates: 選填 {ticker: 上市日期}，新上市股票依上市以來的交易日數判斷是否截斷
+        回傳: 以 ticker 為 index 的 DataFrame，每個檢查項目一個布林欄位
+        """
+        prices = price_panel(raw_data)
+        if prices is None:
+            prices = pd.DataFrame(index=getattr(raw_data, 'index', None))
+        if tickers is not None:
+            prices = prices.reindex(columns=list(tickers))
+
+        volumes = field_panel(raw_data, 'Volume')
+        if volumes is None:
+            volumes = pd.DataFrame(np.nan, index=prices.index, columns=prices.columns)
+        else:
+            volumes = volumes.reindex(columns=prices.columns)
+
+        price_arr = prices.to_numpy(dtype=float)
+        valid = ~np.isnan(price_arr)
+        n_rows = price_arr.shape[0]
+
+        # 1. 截斷：有效收盤價筆數
+        valid_bars = valid.sum(axis=0)
+
+        # 2. 過期：最後一筆有效資料距離整批最新日期差幾根 K 棒
+        last_pos = np.where(valid.any(axis=0), n_rows - 1 - np.argmax(valid[::-1], axis=0), -1)
+        stale_bars = np.where(last_pos >= 0, n_rows - 1 - last_pos, n_rows)
+        index_values = prices.index.to_numpy()
+        last_date = [
+            pd.Timestamp(index_values[pos]).strftime('%Y-%m-%d') if pos >= 0 else None
+            for pos in last_pos
+        ]
+
+        # 3. 缺值：只計算第一筆與最後一筆有效資料之間的空洞
+        valid_cum = np.cumsum(valid, axis=0)
+        inside = (valid_cum > 0) & (valid_cum < valid_cum[-1:]) if n_rows else valid
+        max_nan_gap = _longest_run(~valid & inside)
+
+        # 4. 零成交量連續天數
+        vol_arr = volumes.to_numpy(dtype=float)
+        max_zero_volume = _longest_run(vol_arr == 0)
+
+        # 5. 異常跳動：相鄰有效收盤價的最大變動幅度
+        returns = prices.ffill().pct_change(fill_method=None).abs().to_numpy(dtype=float)
+        returns = np.where(valid, returns, np.nan)
+        has_return = ~np.isnan(returns).all(axis=0) if n_rows else np.zeros(price_arr.shape[1], dtype=bool)
+        max_jump = np.zeros(price_arr.shape[1])
+        if has_return.any():
+            max_jump[has_return] = np.nanmax(returns[:, has_return], axis=0)
+
+        report = pd.DataFrame({
+            'valid_bars': valid_bars,
+            'last_date': last_date,
+            'stale_bars': stale_bars,
+            'max_nan_gap': max_nan_gap,
+            'max_zero_volume': max_zero_volume,
+            'max_jump': max_jump,
+        }, index=prices.columns)
+
+        if check_history:
+            min_bars = self._min_history(prices, listing_dates)
+            report['truncated'] = report['valid_bars'] < min_bars
+        else:
+            report['truncated'] = report['valid_bars'] == 0
+        report['stale'] = report['stale_bars'] > config.QUALITY_MAX_STALE_BARS
+        report['nan_gap'] = report['max_nan_gap'] > config.QUALITY_MAX_NAN_GAP
+        report['zero_volume'] = report['max_zero_volume'] > config.QUALITY_MAX_ZERO_VOLUME
+        report['price_jump'] = report['max_jump'] > config.QUALITY_MAX_DAILY_JUMP
+        return report
+
+    def _min_history(self, prices, listing_dates):
+        """
+        每檔應有的最少 K 棒數：一般為 QUALITY_MIN_HISTORY
+        上市未滿一年的股票改以上市日至最新日期的平日數估算 (真的只有這麼短，不算截斷)
+        """
+        min_bars = np.full(len(prices.columns), float(config.QUALITY_MIN_HISTORY))
+        if not listing_dates or prices.empty:
+            return min_bars
+
+        listed = pd.to_datetime(pd.Series([listing_dates.get(t) for t in prices.columns]), errors='coerce')
+        known = listed.notna().to_numpy()
+        if known.any():
+            end = np.datetime64(prices.index.max().date(), 'D') + 1
+            start = listed[known].to_numpy().astype('datetime64[D]')
+            expected = np.busday_count(start, end) * config.QUALITY_LISTING_COVERAGE
+            min_bars[known] = np.minimum(min_bars[known], expected)
+        return min_bars
+
+    def refetch_tickers(self, report):
+        """需要重新下載的 ticker 清單 (截斷或過期)"""
+        if report.empty:
+            return []
+        return report.index[report[REFETCH_FLAGS].any(axis=1)].tolist()
+
+    def summarize(self, report, refetched=None):
+        """
+        整理成可寫入 JSON 的品質報告：整體統計 + 有問題的個股明細
+        """
+        flags = REFETCH_FLAGS + WARNING_FLAGS
+        flagged = report[report[flags].any(axis=1)] if not report.empty else report
+
+        issues = []
+        for ticker, row in flagged.iterrows():
+            issues.append({
+                "ticker": ticker,
+                "flags": [f for f in flags if row[f]],
+                "valid_bars": int(row['valid_bars']),
+                "last_date": row['last_date'] if isinstance(row['last_date'], str) else None,
+                "stale_bars": int(row['stale_bars']),
+                "max_nan_gap": int(row['max_nan_gap']),
+                "max_zero_volume": int(row['max_zero_volume']),
+                "max_jump_pct": round(float(row['max_jump']) * 100, 1),
+            })
+
+        return {
+            "thresholds": {
+                "min_history": config.QUALITY_MIN_HISTORY,
+                "max_stale_bars": config.QUALITY_MAX_STALE_BARS,
+                "max_nan_gap": config.QUALITY_MAX_NAN_GAP,
+                "max_zero_volume": config.QUALITY_MAX_ZERO_VOLUME,
+                "max_daily_jump": config.QUALITY_MAX_DAILY_JUMP,
+            },
+            "summary": {
+                "checked": int(len(report)),
+                "flagged": int(len(flagged)),
+                "refetched": len(refetched or []),
+                **{f: int(report[f].sum()) if not report.empty else 0 for f in flags},
+            },
+            "refetched": sorted(refetched or []),
+            "issues": issues,
+        }
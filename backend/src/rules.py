@@ -0,0 +1,196 @@
+import glob
+import json
+import os
+import numpy as np
+from . import config
+
+OPERATORS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+
+class ScreenSpecError(ValueError):
+    """篩選規格 (JSON) 格式錯誤或引用了不存在的欄位/參數"""
+
+
+def load_screen_specs(directory=None):
+    """
+    讀取 screens/ 目錄下所有 *.json 篩選規格，並展開 extends 繼承
+    回傳: 依檔名排序的 spec dict 清單
+    """
+    directory = directory or config.SCREENS_DIR
+    specs = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+        spec.setdefault("name", os.path.splitext(os.path.basename(path))[0])
+        specs.append(spec)
+
+    by_name = {spec["name"]: spec for spec in specs}
+    return [_resolve_extends(spec, by_name) for spec in specs]
+
+
+def _resolve_extends(spec, by_name, seen=()):
+    """extends: 繼承另一個 screen 的 params / gates / rules，再附加自己的規則"""
+    parent_name = spec.get("extends")
+    if not parent_name:
+        return spec
+    if parent_name not in by_name or parent_name in seen:
+        raise ScreenSpecError(f"screen '{spec['name']}' 無法繼承 '{parent_name}'")
+    parent = _resolve_extends(by_name[parent_name], by_name, seen + (spec["name"],))
+    return {
+        **spec,
+        "params": {**parent.get("params", {}), **spec.get("params", {})},
+        "gates": parent.get("gates", []) + spec.get("gates", []),
+        "rules": parent.get("rules", []) + spec.get("rules", []),
+    }
+
+
+class CompiledScreen:
+    """
+    單一篩選規格編譯後的結果
+    每個條件都是 [左運算元, 運算子, 右運算元]，運算元可為：
+    - 數字 (1.3)
+    - 快照欄位名稱 ("SMA_150")
+    - 參數 ("$RS_THRESHOLD"，依序查 overrides -> spec params -> config.py)
+    - 以 * 相乘的組合 ("Low_52W * $DIST_FROM_LOW_THRESHOLD")
+    欄位為 NaN 時比較結果一律為 False (該條件不通過)
+    """
+
+    def __init__(self, spec, overrides=None):
+        self.name = spec["name"]
+        self.description = spec.get("description", "")
+        self.params = {**spec.get("params", {}), **(overrides or {})}
+        self.columns = set()
+        self.param_names = set()   # 實際引用的 $參數 (可被 overrides 覆寫的項目)
+
+        self.gate_ids, self.gate_reasons, self.gates = [], [], []
+        for gate in spec.get("gates", []):
+            self.gate_ids.append(gate["id"])
+            self.gate_reasons.append(gate.get("reason", gate["id"]))
+            self.gates.append(self._compile_conditions(gate))
+
+        self.rule_ids, self.rules = [], []
+        for rule in spec.get("rules", []):
+            self.rule_ids.append(rule["id"])
+            self.rules.append(self._compile_conditions(rule))
+
+        if not self.rules:
+            raise ScreenSpecError(f"screen '{self.name}' 沒有任何 rules")
+
+    def _compile_conditions(self, rule):
+        conditions = rule.get("when")
+        if not conditions:
+            raise ScreenSpecError(f"screen '{self.name}' 的 '{rule.get('id')}' 缺少 when 條件")
+        compiled = []
+        for condition in conditions:
+            if len(condition) != 3 or condition[1] not in OPERATORS:
+                raise ScreenSpecError(f"screen '{self.name}' 條件格式錯誤: {condition}")
+            lhs, op, rhs = condition
+            compiled.append((self._compile_operand(lhs), OPERATORS[op], self._compile_operand(rhs)))
+        return compiled
+
+    def _compile_operand(self, operand):
+        """回傳 (常數係數, 欄位清單)：運算結果 = 係數 * 各欄位相乘"""
+        if isinstance(operand, (int, float)) and not isinstance(operand, bool):
+            return float(operand), ()
+
+        scale, columns = 1.0, []
+        for term in str(operand).split("*"):
+            term = term.strip()
+            if term.startswith("$"):
+                scale *= self._param(term[1:])
+                continue
+            try:
+                scale *= float(term)
+            except ValueError:
+                columns.append(term)
+                self.columns.add(term)
+        return scale, tuple(columns)
+
+    def _param(self, key):
+        self.param_names.add(key)
+        if key in self.params:
+            return float(self.params[key])
+        if hasattr(config, key):
+            return float(getattr(config, key))
+        raise ScreenSpecError(f"screen '{self.name}' 引用了不存在的參數 ${key}")
+
+    @staticmethod
+    def _operand_value(operand, arrays, size):
+        scale, columns = operand
+        value = np.full(size, scale)
+        for col in columns:
+            value = value * arrays[col]
+        return value
+
+    def _evaluate_group(self, compiled_rules, arrays, size):
+        """每條規則的條件 AND 起來，回傳 (規則數, 股票數) 的布林矩陣"""
+        matrix = np.ones((len(compiled_rules), size), dtype=bool)
+        with np.errstate(invalid='ignore'):
+            for i, conditions in enumerate(compiled_rules):
+                for lhs, op, rhs in conditions:
+                    matrix[i] &= op(self._operand_value(lhs, arrays, size), self._operand_value(rhs, arrays, size))
+        return matrix
+
+    def evaluate(self, arrays, size):
+        """
+        對整個快照一次計算
+        回傳 dict: details (規則數 x 股票數)、score、passed、fail_reason
+        """
+        details = self._evaluate_group(self.rules, arrays, size)
+        gates = self._evaluate_group(self.gates, arrays, size)
+
+        score = details.sum(axis=0)
+        rule_failed = ~details
+        gate_failed = ~gates
+
+        rule_reason = np.where(
+            rule_failed.any(axis=0), np.array(self.rule_ids, dtype=object)[rule_failed.argmax(axis=0)], ""
+        )
+        if self.gates:
+            gate_reason = np.array(self.gate_reasons, dtype=object)[gate_failed.argmax(axis=0)]
+            fail_reason = np.where(gate_failed.any(axis=0), gate_reason, rule_reason)
+        else:
+            fail_reason = rule_reason
+
+        return {
+            "details": details,
+            "score": score,
+            "passed": gates.all(axis=0) & details.all(axis=0),
+            "fail_reason": fail_reason,
+        }
+
+
+class RuleEngine:
+    """
+    將多個篩選規格編譯一次後，對整個指標快照 (每列一檔股票) 單次取欄、同時評估
+    """
+
+    def __init__(self, specs, overrides=None):
+        self.screens = [CompiledScreen(spec, overrides) for spec in specs]
+        self.columns = set().union(*(screen.columns for screen in self.screens))
+        self.param_names = set().union(*(screen.param_names for screen in self.screens))
+
+    @property
+    def names(self):
+        return [screen.name for screen in self.screens]
+
+    def evaluate(self, snapshot):
+        """
+        snapshot: 以 ticker 為 index 的 DataFrame
+        回傳: {screen 名稱: evaluate 結果}
+        """
+        missing = self.columns - set(snapshot.columns)
+        if missing:
+            raise ScreenSpecError(f"快照缺少篩選規格引用的欄位: {sorted(missing)}")
+
+        # 每個欄位只轉換一次，所有 screen 共用
+        arrays = {col: snapshot[col].to_numpy(dtype=float) for col in self.columns}
+        size = len(snapshot)
+        return {screen.name: screen.evaluate(arrays, size) for screen in self.screens}
@@ -5,132 +5,126 @@ import csv
 import os
 import numpy as np
 from datetime import datetime, timezone, timedelta
+from .rules import RuleEngine, ScreenSpecError, load_screen_specs
+
+# 結果中要輸出的快照欄位 (NaN 一律以 0 顯示，NULLABLE_COLUMNS 除外)
+DISPLAY_COLUMNS = [
+    'Price', 'Vol_SMA_20', 'RS_Rating', 'Group_ROC', 'Group_RS', 'Group_Rank',
+    'SMA_50', 'SMA_150', 'SMA_200', 'SMA_200_Prev', 'High_52W', 'Low_52W',
+    'VCP_Contractions', 'VCP_Max_Depth', 'VCP_Final_Depth', 'VCP_Pivot',
+    'VCP_Volume_Ratio', 'VCP_Volume_Dryup', 'VCP_Setup',
+]
+# 族群未排名 (無產業類別或成員不足) 時輸出 null，避免與最弱族群的 0 混淆
+NULLABLE_COLUMNS = ['Group_ROC', 'Group_RS']
 
 class MinerviniValidator:
-    def validate(self, ticker, name, df):
+    def __init__(self, specs=None, overrides=None):
         """
-        執行 8+1 條件判定 (FR-04, FR-06)
-        並輸出關鍵價位供檢視
+        specs: 篩選規格清單 (預設讀取 screens/*.json)
+        overrides: 選填的參數覆寫，例如 {"RS_THRESHOLD": 80}
         """
-        # 取最新一筆資料
-        row = df.iloc[-1]
-        
-        # 使用 Adj Close 或 Close，並強制轉為原生 float
-        raw_price = row['Adj Close'] if 'Adj Close' in row else row['Close']
-        price = float(raw_price) if not pd.isna(raw_price) else 0.0
-        
-        # === 提取關鍵指標數值 (Handling NaN) ===
-        def get_val(key, default=0.0):
-            val = row.get(key, default)
-            return float(val) if not pd.isna(val) else default
-
-        sma_50 = get_val('SMA_50')
-        sma_150 = get_val('SMA_150')
-        sma_200 = get_val('SMA_200')
-        sma_200_prev = get_val('SMA_200_Prev')
-        low_52w = get_val('Low_52W')
-        high_52w = get_val('High_52W')
-        
-        results = {}
-        
-        # === FR-06: 流動性檢查 ===
-        is_liquid = bool(row['Vol_SMA_20'] >= config.MIN_AVG_VOLUME_SHARES)
-        
-        # === FR-04: 8大技術條件 ===
-        # C1: 價格 > 150 > 200
-        results['c1_trend_stack'] = bool((price > sma_150) and (sma_150 > sma_200))
-        
-        # C2: 150 > 200
-        results['c2_long_term'] = bool(sma_150 > sma_200)
-        
-        # C3: 200MA 向上
-        results['c3_ma200_slope'] = bool(sma_200 > sma_200_prev)
-        
-        # C4: 50 > 150 & 200
-        results['c4_mid_term'] = bool((sma_50 > sma_150) and (sma_50 > sma_200))
-        
-        # C5: 價格 > 50
-        results['c5_momentum'] = bool(price > sma_50)
-        
-        # C6: 高於低點 30%
-        if pd.isna(row['Low_52W']):
-            results['c6_support'] = False
-        else:
-            c6_threshold = low_52w * config.DIST_FROM_LOW_THRESHOLD
-            results['c6_support'] = bool(price >= c6_threshold)
-        
-        # C7: 在高點 25% 內
-        if pd.isna(row['High_52W']):
-            results['c7_resistance'] = False
-        else:
-            c7_threshold = high_52w * config.DIST_FROM_HIGH_THRESHOLD
-            results['c7_resistance'] = bool(price >= c7_threshold)
-        
-        # C8: RS > 70
-        rs_val = row['RS_Rating']
-        if pd.isna(rs_val):
-            rs_val = 0
-        results['c8_rs_strength'] = bool(rs_val >= config.RS_THRESHOLD)
-        
-        # 計算總分
-        technical_score = sum(results.values())
-        
-        # 判定狀態
-        status = "FAIL"
-        fail_reason = ""
-        
-        if not is_liquid:
-            fail_reason = "Liquidity (Low Volume)"
-        elif technical_score == 8:
-            status = "PASS"
-        else:
-            # 找出第一個失敗的原因
-            for k, v in results.items():
-                if not v:
-                    fail_reason = k
-                    break
-        
-        # === 數值防呆處理 ===
-        vol_avg = row['Vol_SMA_20']
-        if pd.isna(vol_avg):
-            vol_avg = 0
-            
-        dist_low_str = "N/A"
-        if low_52w != 0:
-            dist_low_str = f"{((price - low_52w)/low_52w)*100:.1f}%"
-            
-        dist_high_str = "N/A"
-        if high_52w != 0:
-            dist_high_str = f"{((price - high_52w)/high_52w)*100:.1f}%"
-
-        return {
-            "ticker": ticker,
-            "name": name,
-            "price": round(price, 2),
-            "rs_rating": int(rs_val),
-            "vol_avg": int(vol_avg),
-            "status": status,
-            "fail_reason": fail_reason,
-            "match_count": f"{technical_score}/8",
-            "details": results,
-            "dist_low_pct": dist_low_str,
-            "dist_high_pct": dist_high_str,
-            # 新增：關鍵指標數值 (供前端或報表檢視用)
-            "indicators": {
-                "SMA_50": round(sma_50, 2),
-                "SMA_150": round(sma_150, 2),
-                "SMA_200": round(sma_200, 2),
-                "SMA_200_Prev": round(sma_200_prev, 2),
-                "High_52W": round(high_52w, 2),
-                "Low_52W": round(low_52w, 2)
+        self.engine = RuleEngine(specs if specs is not None else load_screen_specs(), overrides)
+        self.primary = config.PRIMARY_SCREEN
+        if self.primary not in self.engine.names:
+            raise ScreenSpecError(f"找不到主要篩選規格 '{self.primary}'")
+
+    @property
+    def screens(self):
+        return [{"name": s.name, "description": s.description, "rules": s.rule_ids} for s in self.engine.screens]
+
+    def validate_snapshot(self, snapshot, names=None, industries=None):
+        """
+        以篩選規格對整個指標快照 (每列一檔) 一次判定 (FR-04, FR-06)
+        主要 screen 決定 status / details，其餘 screen 各自輸出 score、status 與第一個失敗原因
+        並輸出關鍵價位、產業族群強度與 VCP 型態供檢視
+        """
+        names = names or {}
+        industries = industries or {}
+        evaluations = self.engine.evaluate(snapshot)
+
+        primary_screen = next(s for s in self.engine.screens if s.name == self.primary)
+        primary = evaluations[self.primary]
+        other_screens = [s for s in self.engine.screens if s.name != self.primary]
+
+        # 一次轉成數值陣列，NaN 以 0 顯示 (可為 null 的欄位以 None 表示)
+        display = snapshot.reindex(columns=DISPLAY_COLUMNS).apply(pd.to_numeric, errors='coerce')
+        nullable = display[NULLABLE_COLUMNS].astype(object).where(display[NULLABLE_COLUMNS].notna(), None)
+        display = display.fillna(0.0)
+        values = {col: display[col].tolist() for col in DISPLAY_COLUMNS}
+        values.update({col: nullable[col].tolist() for col in NULLABLE_COLUMNS})
+        details = primary["details"].T.tolist()
+        n_rules = len(primary_screen.rule_ids)
+
+        results = []
+        for i, ticker in enumerate(snapshot.index):
+            v = {col: values[col][i] for col in DISPLAY_COLUMNS}
+            price, low_52w, high_52w = v['Price'], v['Low_52W'], v['High_52W']
+
+            dist_low_str = "N/A"
+            if low_52w != 0:
+                dist_low_str = f"{((price - low_52w)/low_52w)*100:.1f}%"
+                
+            dist_high_str = "N/A"
+            if high_52w != 0:
+                dist_high_str = f"{((price - high_52w)/high_52w)*100:.1f}%"
+
+            score = int(primary["score"][i])
+            res = {
+                "ticker": ticker,
+                "name": names.get(ticker, ""),
+                "price": round(price, 2),
+                "rs_rating": int(v['RS_Rating']),
+                "industry": industries.get(ticker, ""),
+                "group_roc": None if v['Group_ROC'] is None else round(v['Group_ROC'], 4),
+                "group_rs": None if v['Group_RS'] is None else int(v['Group_RS']),
+                "group_rank": int(v['Group_Rank']),
+                "vol_avg": int(v['Vol_SMA_20']),
+                "status": "PASS" if primary["passed"][i] else "FAIL",
+                "fail_reason": primary["fail_reason"][i],
+                "match_count": f"{score}/{n_rules}",
+                "details": dict(zip(primary_screen.rule_ids, details[i])),
+                "dist_low_pct": dist_low_str,
+                "dist_high_pct": dist_high_str,
+                # VCP 波動收縮型態 (深度以百分比表示)
+                "vcp": {
+                    "contractions": int(v['VCP_Contractions']),
+                    "max_depth_pct": round(v['VCP_Max_Depth'] * 100, 1),
+                    "final_depth_pct": round(v['VCP_Final_Depth'] * 100, 1),
+                    "pivot": round(v['VCP_Pivot'], 2),
+                    "volume_ratio": round(v['VCP_Volume_Ratio'], 2),
+                    "volume_dryup": bool(v['VCP_Volume_Dryup']),
+                    "setup": bool(v['VCP_Setup'])
+                },
+                # 新增：關鍵指標數值 (供前端或報表檢視用)
+                "indicators": {
+                    "SMA_50": round(v['SMA_50'], 2),
+                    "SMA_150": round(v['SMA_150'], 2),
+                    "SMA_200": round(v['SMA_200'], 2),
+                    "SMA_200_Prev": round(v['SMA_200_Prev'], 2),
+                    "High_52W": round(high_52w, 2),
+                    "Low_52W": round(low_52w, 2)
+                }
             }
-        }
+
+            # 其他 screen 的判定結果
+            if other_screens:
+                res["screens"] = {
+                    screen.name: {
+                        "status": "PASS" if evaluations[screen.name]["passed"][i] else "FAIL",
+                        "score": f"{int(evaluations[screen.name]['score'][i])}/{len(screen.rule_ids)}",
+                        "fail_reason": evaluations[screen.name]["fail_reason"][i],
+                    }
+                    for screen in other_screens
+                }
+            results.append(res)
+
+        return results
 
 class ReportGenerator:
-    def generate(self, validation_results):
+    def generate(self, validation_results, screens=None):
         """
-        生成 CSV 與 JSON (FR-05)
-        JSON 結構變更為包含 metadata
+        生成 JSON (FR-05)；CSV 改由 /export 依需求產生
+        JSON 結構變更為包含 metadata (screens: 本次使用的篩選規格摘要)
         """
         # 設定台灣時區 (UTC+8)
         tw_tz = timezone(timedelta(hours=8))
@@ -146,7 +140,9 @@ class ReportGenerator:
                     "dist_low_pct": config.DIST_FROM_LOW_THRESHOLD,
                     "dist_high_pct": config.DIST_FROM_HIGH_THRESHOLD,
                     "ma_slope_lookback": config.MA_SLOPE_LOOKBACK
-                }
+                },
+                "primary_screen": config.PRIMARY_SCREEN,
+                "screens": screens or []
             },
             "data": validation_results
         }
@@ -161,39 +157,32 @@ class ReportGenerator:
             with open(json_path, "w", encoding="utf-8") as f:
                  json.dump(output_data, f, ensure_ascii=False, indent=2, default=str)
             
-        # 3. CSV 輸出 (保持扁平化，增加 Name 與 Indicators 欄位)
-        csv_data = []
-        for res in validation_results:
-            row = {
-                "Ticker": res['ticker'],
-                "Name": res['name'],
-                "Price": res['price'],
-                "Status": res['status'],
-                "Reason": res['fail_reason'],
-                "Score": res['match_count'],
-                "RS": res['rs_rating'],
-                "Volume_Avg": res['vol_avg'],
-                "Dist_Low": res['dist_low_pct'],
-                "Dist_High": res['dist_high_pct']
-            }
-            # 加入條件細節 boolean
-            for k, v in res['details'].items():
-                row[k] = v
-            
-            # 加入關鍵指標數值
-            for k, v in res['indicators'].items():
-                row[k] = v
-                
-            csv_data.append(row)
-            
-        if csv_data:
-            df = pd.DataFrame(csv_data)
-            csv_path = os.path.join(config.OUTPUT_DIR, "results.csv")
-            df.to_csv(csv_path, index=False, encoding="utf-8-sig")
-            print(f"報告已生成:\n - {json_path}\n - {csv_path}")
+        # CSV 不再於每次執行時產生，改由 server 的 /export 依需求串流輸出
+        if validation_results:
+            print(f"報告已生成:\n - {json_path}")
             
             # 顯示簡單統計
             pass_count = len([r for r in validation_results if r['status'] == "PASS"])
             print(f"\n篩選完成！共 {len(validation_results)} 檔，合格: {pass_count} 檔。")
         else:
-            print("\n沒有產生任何結果數據。")
\ No newline at end of file
+            print("\n沒有產生任何結果數據。")
+
+        return output_data
+
+    def generate_quality_report(self, quality_report):
+        """
+        將資料品質檢查結果寫入 quality_report.json (與 results.json 放在同一目錄)
+        """
+        if not quality_report:
+            return
+
+        tw_tz = timezone(timedelta(hours=8))
+        output_data = {
+            "metadata": {"timestamp": datetime.now(tw_tz).isoformat()},
+            **quality_report
+        }
+
+        json_path = os.path.join(config.OUTPUT_DIR, "quality_report.json")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(output_data, f, ensure_ascii=False, indent=2, default=str)
+        print(f" - {json_path}")
@@ -0,0 +1,119 @@
+import warnings
+import numpy as np
+import pandas as pd
+from . import config
+from .panel import field_panel
+
+
+class VCPDetector:
+    """
+    波動收縮型態 (Volatility Contraction Pattern) 偵測
+    將最近 VCP_LOOKBACK 根 K 棒切成等長區段，對全市場一次計算 (日期 x 股票 的 numpy 陣列)：
+    - 各區段回檔深度 = 區段內自當時最高點 (累計最高) 拉回的最大幅度，上漲走勢不算回檔
+    - 從最近區段往前數，回檔深度連續遞減 (且每次都有實際回檔) 的段數即為收縮次數
+    - 最後一段的最高價作為樞紐價 (Pivot)
+    - 最後一段均量相對整個基底均量明顯萎縮即為量縮 (Volume Dry-up)
+    """
+
+    def detect(self, raw_data, tickers=None):
+        """
+        回傳: 以 ticker 為 index 的 DataFrame
+        (VCP_Contractions, VCP_Max_Depth, VCP_Final_Depth, VCP_Pivot, VCP_Volume_Ratio, VCP_Volume_Dryup, VCP_Setup)
+        """
+        high, low, volume = self._adjusted_panels(raw_data)
+        if high is None:
+            return pd.DataFrame()
+        if tickers is not None:
+            columns = [t for t in tickers if t in high.columns]
+            high, low, volume = high[columns], low[columns], volume[columns]
+
+        segment = config.VCP_SEGMENT_BARS
+        n_segments = config.VCP_LOOKBACK // segment
+        window = n_segments * segment
+
+        # 每檔各自取最後 window 根有效 K 棒 (不同股票的停牌日不同，不能直接取面板最後幾列)
+        high_arr = high.to_numpy(dtype=float)
+        low_arr = low.to_numpy(dtype=float)
+        valid = ~np.isnan(high_arr) & ~np.isnan(low_arr)
+        high_arr, low_arr, vol_arr = (
+            self._last_valid_window(arr, valid, window)
+            for arr in (high_arr, low_arr, volume.to_numpy(dtype=float))
+        )
+
+        n_tickers = high_arr.shape[1]
+        with warnings.catch_warnings():
+            # 歷史不足的股票整段都是 NaN，結果維持 NaN 即可
+            warnings.simplefilter('ignore', RuntimeWarning)
+            high_seg = high_arr.reshape(n_segments, segment, n_tickers)
+            low_seg = low_arr.reshape(n_segments, segment, n_tickers)
+            # 區段內的累計最高價 (fmax 略過歷史不足時補上的 NaN)
+            running_high = np.fmax.accumulate(high_seg, axis=1)
+            seg_high = running_high[:, -1, :]
+            depth = np.nanmax((running_high - low_seg) / running_high, axis=1)
+            base_volume = np.nanmean(vol_arr, axis=0)
+            last_volume = np.nanmean(vol_arr[-segment:], axis=0)
+
+        # 從最後一段往前，計算回檔深度連續遞減的次數 (回檔太小的區段不算收縮)
+        shrinking = (depth[1:] < depth[:-1]) & (depth[1:] >= config.VCP_MIN_PULLBACK)
+        trailing = np.cumprod(shrinking[::-1], axis=0).sum(axis=0)
+        contractions = np.where(trailing > 0, trailing + 1, 0)
+
+        # 收縮序列第一段 (最深) 與最後一段 (最淺) 的深度
+        first_idx = (n_segments - 1 - trailing)[np.newaxis, :]
+        max_depth = np.take_along_axis(depth, first_idx, axis=0)[0]
+        final_depth = depth[-1]
+
+        pivot = seg_high[-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            volume_ratio = np.where(base_volume > 0, last_volume / base_volume, np.nan)
+
+        volume_dryup = volume_ratio <= config.VCP_VOLUME_DRYUP_RATIO
+        setup = (
+            (contractions >= config.VCP_MIN_CONTRACTIONS)
+            & (final_depth <= config.VCP_MAX_FINAL_DEPTH)
+            & volume_dryup
+        )
+
+        return pd.DataFrame({
+            'VCP_Contractions': contractions.astype(int),
+            'VCP_Max_Depth': max_depth,
+            'VCP_Final_Depth': final_depth,
+            'VCP_Pivot': pivot,
+            'VCP_Volume_Ratio': volume_ratio,
+            'VCP_Volume_Dryup': volume_dryup,
+            'VCP_Setup': setup,
+        }, index=high.columns)
+
+    def _adjusted_panels(self, raw_data):
+        """
+        取出 High / Low / Volume 寬表，並以 Adj Close / Close 比例還原權息
+        (讓樞紐價與驗證時使用的 Adj Close 在同一個價格基準上)
+        """
+        high = field_panel(raw_data, 'High')
+        low = field_panel(raw_data, 'Low')
+        volume = field_panel(raw_data, 'Volume')
+        if high is None or low is None or volume is None:
+            return None, None, None
+
+        close = field_panel(raw_data, 'Close')
+        adj_close = field_panel(raw_data, 'Adj Close')
+        if close is not None and adj_close is not None:
+            factor = (adj_close / close).reindex(columns=high.columns)
+            high = high * factor
+            low = low * factor
+        return high, low, volume.reindex(columns=high.columns)
+
+    @staticmethod
+    def _last_valid_window(arr, valid, window):
+        """
+        依 valid 遮罩將每一欄的有效 K 棒靠下對齊後取最後 window 列
+        資料不足的欄位上方補 NaN
+        """
+        n_rows, n_cols = arr.shape
+        # 穩定排序：無效列排前面，有效列維持原本時間順序排在後面
+        order = np.argsort(valid, axis=0, kind='stable')
+        packed = np.where(np.take_along_axis(valid, order, axis=0), np.take_along_axis(arr, order, axis=0), np.nan)
+        if n_rows >= window:
+            return packed[-window:]
+        padding = np.full((window - n_rows, n_cols), np.nan)
+        return np.vstack([padding, packed])
@@ -0,0 +1,87 @@
+import os
+import pickle
+import threading
+from functools import lru_cache
+from . import config
+from .rules import ScreenSpecError, load_screen_specs
+from .validator import MinerviniValidator
+
+
+class WatchlistScreener:
+    """
+    對自選清單即時套用篩選規格
+    使用最後一次完整執行所留下的指標快照 (RS 已是相對全市場的排名)，不觸發任何下載或指標運算
+    快照只在完整執行後整份替換，多個請求可同時讀取
+    """
+
+    def __init__(self):
+        self._specs = load_screen_specs()
+        self._payload = None
+        self._lock = threading.Lock()
+        self._validator = lru_cache(maxsize=32)(self._build_validator)
+        # 只允許覆寫篩選規格實際引用的 $參數
+        self.param_names = self._validator(()).engine.param_names
+
+    def load(self):
+        """從 cache 載入最新快照 (檔案不存在時維持原狀)"""
+        if not os.path.exists(config.SNAPSHOT_PATH):
+            return False
+        try:
+            with open(config.SNAPSHOT_PATH, "rb") as f:
+                payload = pickle.load(f)
+        except Exception as e:
+            print(f"⚠️ 指標快照讀取失敗: {e}")
+            return False
+        with self._lock:
+            self._payload = payload
+        print(f"📋 已載入指標快照 ({len(payload['snapshot'])} 檔，{payload['timestamp']})")
+        return True
+
+    def _build_validator(self, overrides):
+        """相同的參數覆寫只編譯一次"""
+        return MinerviniValidator(self._specs, dict(overrides))
+
+    def _normalize_overrides(self, overrides):
+        normalized = {}
+        for key, value in (overrides or {}).items():
+            if key not in self.param_names:
+                raise ScreenSpecError(f"未知的參數: {key} (可覆寫: {', '.join(sorted(self.param_names))})")
+            normalized[key] = float(value)
+        return tuple(sorted(normalized.items()))
+
+    def _resolve_tickers(self, tickers, index):
+        """接受 2330 / 2330.TW / 2330.TWO，自動補上市場後綴"""
+        found, not_found = [], []
+        for raw in tickers:
+            ticker = raw.strip().upper()
+            candidates = [ticker] if "." in ticker else [f"{ticker}.TW", f"{ticker}.TWO"]
+            match = next((c for c in candidates if c in index), None)
+            if match is None:
+                not_found.append(raw)
+            elif match not in found:
+                found.append(match)
+        return found, not_found
+
+    def screen(self, tickers, overrides=None):
+        """
+        回傳: {timestamp, overrides, results (格式同 results.json 的 data), not_found}
+        清單超過上限拋出 ValueError，未知的參數覆寫拋出 ScreenSpecError，尚無快照拋出 LookupError
+        """
+        if len(tickers) > config.WATCHLIST_MAX_TICKERS:
+            raise ValueError(f"單次最多 {config.WATCHLIST_MAX_TICKERS} 檔，收到 {len(tickers)} 檔")
+        key = self._normalize_overrides(overrides)
+
+        payload = self._payload
+        if payload is None:
+            raise LookupError("尚未有指標快照，請先完成一次選股流程")
+        validator = self._validator(key)
+
+        snapshot = payload["snapshot"]
+        found, not_found = self._resolve_tickers(tickers, snapshot.index)
+        results = validator.validate_snapshot(snapshot.loc[found], payload["names"], payload["industries"])
+        return {
+            "timestamp": payload["timestamp"],
+            "overrides": dict(key),
+            "results": results,
+            "not_found": not_found,
+        }
@@ -0,0 +1,55 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from . import config
+
+# 子程序中的進度佇列 (由 _init_worker 設定)
+_progress_queue = None
+
+
+def _init_worker(queue):
+    global _progress_queue
+    _progress_queue = queue
+
+
+def _forward_progress(stage, **info):
+    _progress_queue.put((stage, info))
+
+
+def _run_pipeline(profile):
+    """子程序進入點：完整執行選股流程，只回傳精簡的結果 (metadata + data)"""
+    import main
+    return main.main(progress=_forward_progress, profile=profile)
+
+
+def run_pipeline_isolated(progress=None, profile=None):
+    """
+    在獨立的子程序中執行 main.main()，API 程序本身不載入行情面板與指標 DataFrame
+    - 每次執行都建立新的子程序，結束即退出，記憶體完整歸還作業系統
+    - 子程序的進度事件經由 multiprocessing.Queue 轉送給 progress 回呼
+    - 子程序異常終止 (例如記憶體不足被殺) 時拋出 BrokenProcessPool
+    回傳: 與 main.main() 相同
+    """
+    ctx = multiprocessing.get_context(config.WORKER_START_METHOD)
+    queue = ctx.Queue()
+
+    def drain():
+        while True:
+            item = queue.get()
+            if item is None:
+                break
+            stage, info = item
+            if progress is not None:
+                progress(stage, **info)
+
+    forwarder = threading.Thread(target=drain, daemon=True)
+    forwarder.start()
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx,
+                                 initializer=_init_worker, initargs=(queue,)) as pool:
+            return pool.submit(_run_pipeline, profile).result()
+    finally:
+        # 子程序已結束，佇列中剩餘的事件轉送完畢後停止轉送執行緒
+        queue.put(None)
+        forwarder.join()
+        queue.close()
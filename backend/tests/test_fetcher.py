@@ -0,0 +1,106 @@
+import sys
+import os
+
+# 將 backend 加入 path 以便 import src
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from src import config
+from src import fetcher as fetcher_module
+from src.fetcher import StockFetcher
+
+DATES = pd.bdate_range(end=pd.Timestamp.now().normalize() - pd.offsets.BDay(1), periods=600)
+
+
+class FakeYahoo:
+    """依 ticker 產生固定的日線資料；factor 模擬除權息後整段還原價改寫，short 模擬被截斷的歷史"""
+
+    def __init__(self):
+        self.factor = {}
+        self.short = {}
+        self.calls = []
+
+    def download(self, tickers, start=None, **kwargs):
+        self.calls.append((list(tickers), start))
+        frames = {}
+        for ticker in tickers:
+            rng = np.random.default_rng(sum(map(ord, ticker)))
+            close = 100 * np.exp(np.cumsum(rng.normal(0.001, 0.02, len(DATES))))
+            df = pd.DataFrame({
+                "Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+                "Adj Close": close * self.factor.get(ticker, 1.0),
+                "Volume": rng.integers(100_000, 5_000_000, len(DATES)).astype(float),
+            }, index=DATES)
+            if ticker in self.short:
+                df.iloc[:-self.short[ticker]] = np.nan
+            frames[ticker] = df[df.index >= start]
+        return pd.concat(frames, axis=1)
+
+    def full_downloads(self):
+        """曾經以完整歷史 (非增量區間) 下載過的 ticker"""
+        recent_start = (DATES[-1] - pd.Timedelta(days=config.INCREMENTAL_OVERLAP_DAYS)).strftime('%Y-%m-%d')
+        return {t for tickers, start in self.calls if start != recent_start for t in tickers}
+
+
+@pytest.fixture
+def yahoo(monkeypatch, tmp_path):
+    fake = FakeYahoo()
+    monkeypatch.setattr(config, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(fetcher_module.yf, "download", fake.download)
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    return fake
+
+
+def _fetch_next_day(tickers):
+    """讓資料庫看起來是昨天寫入的，觸發增量更新"""
+    fetcher = StockFetcher()
+    yesterday = time.time() - 86400
+    os.utime(fetcher.store_path, (yesterday, yesterday))
+    return fetcher, fetcher.fetch_batch(tickers)
+
+
+def test_incremental_update_restates_keeps_and_heals(yahoo):
+    tickers = ["1101.TW", "2330.TW", "2603.TW"]
+    yahoo.short["2603.TW"] = 100            # 第一天 Yahoo 只給 100 根
+    first = StockFetcher().fetch_batch(tickers)
+    assert first["2603.TW"]["Close"].notna().sum() == 100
+
+    yahoo.calls.clear()
+    yahoo.short.clear()
+    yahoo.factor["2330.TW"] = 0.97          # 除權息：整段還原價改寫
+    fetcher, data = _fetch_next_day(tickers)
+
+    # 調整因子改變：重抓完整歷史，連最早的還原價也更新
+    assert fetcher.restated == ["2330.TW"]
+    assert "2330.TW" in yahoo.full_downloads()
+    assert data["2330.TW"]["Adj Close"].iloc[0] == pytest.approx(first["2330.TW"]["Adj Close"].iloc[0] * 0.97)
+
+    # 未受影響：只下載最近區間，沿用資料庫中的歷史
+    assert "1101.TW" not in yahoo.full_downloads()
+    pd.testing.assert_frame_equal(data["1101.TW"], first["1101.TW"], check_freq=False)
+
+    # 資料庫中被截斷的歷史：重抓後補齊
+    assert "2603.TW" in yahoo.full_downloads()
+    assert data["2603.TW"]["Close"].notna().sum() == len(DATES)
+
+
+def test_short_history_of_new_listing_is_not_refetched(yahoo):
+    tickers = ["1101.TW", "6999.TW"]
+    yahoo.short["6999.TW"] = 100
+    listed = DATES[-100].strftime('%Y-%m-%d')
+
+    fetcher = StockFetcher()
+    fetcher.listing_dates = {"6999.TW": listed}
+    fetcher.fetch_batch(tickers)
+    assert len(yahoo.calls) == 1
+
+    yahoo.calls.clear()
+    fetcher = StockFetcher()
+    fetcher.listing_dates = {"6999.TW": listed}
+    yesterday = time.time() - 86400
+    os.utime(fetcher.store_path, (yesterday, yesterday))
+    fetcher.fetch_batch(tickers)
+    assert yahoo.full_downloads() == set()
@@ -0,0 +1,49 @@
+import sys
+import os
+
+# 將 backend 加入 path 以便 import src
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+import pandas as pd
+from src.vcp import VCPDetector
+
+
+def _panel(closes, volume, spread=0.001):
+    """以收盤價序列組出 (ticker, 欄位) 多層索引的面板，High/Low 為收盤價上下 spread"""
+    index = pd.bdate_range("2025-01-02", periods=len(next(iter(closes.values()))))
+    frames = {
+        ticker: pd.DataFrame({
+            "Open": close, "High": close * (1 + spread), "Low": close * (1 - spread),
+            "Close": close, "Adj Close": close, "Volume": volume,
+        }, index=index)
+        for ticker, close in closes.items()
+    }
+    return pd.concat(frames, axis=1)
+
+
+def test_monotonic_uptrend_has_no_contractions():
+    n = 300
+    rng = np.random.default_rng(0)
+    line = np.linspace(10, 20, n)
+    raw = _panel(
+        {"LINE": line, "NOISY": line * (1 + rng.uniform(-0.001, 0.001, n))},
+        volume=np.linspace(2e6, 5e5, n),
+    )
+
+    result = VCPDetector().detect(raw)
+
+    assert (result["VCP_Contractions"] == 0).all()
+    assert not result["VCP_Setup"].any()
+
+
+def test_shrinking_pullbacks_are_detected():
+    pullback = lambda depth: 20 * (1 - depth * np.sin(np.linspace(0, np.pi, 20)))
+    closes = np.concatenate([np.linspace(10, 20, 200)] + [pullback(d) for d in (0.25, 0.15, 0.08, 0.04, 0.02)])
+    volume = np.r_[np.full(280, 2e6), np.full(20, 5e5)]
+
+    result = VCPDetector().detect(_panel({"VCP": closes}, volume)).loc["VCP"]
+
+    assert result["VCP_Contractions"] == 5
+    assert result["VCP_Final_Depth"] < 0.03
+    assert result["VCP_Setup"]
@@ -1,9 +1,9 @@
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { Header } from './components/Header';
 import { FilterBar } from './components/FilterBar';
 import { StockTable } from './components/StockTable';
-import type { APIResponse } from './types/schema';
-import { Loader2, AlertCircle } from 'lucide-react';
+import type { APIResponse, ProgressEvent, ResultsDeltaEvent, StatusEvent } from './types/schema';
+import { Loader2, AlertCircle, RefreshCw } from 'lucide-react';
 
 // 開發環境下，請將此處指向您的後端路徑，或將 results.json 複製到 public/
 // 在 Codespaces 中，如果前後端分開跑，可能需要指向 '/backend/output/results.json' 
@@ -13,6 +13,28 @@ import { Loader2, AlertCircle } from 'lucide-react';
 
 const API_BASE = import.meta.env.VITE_API_URL || "http://localhost:8000";
 const DATA_URL = `${API_BASE}/data/results.json`;
+const EVENTS_URL = `${API_BASE}/events`;
+
+// 各執行階段的顯示文字
+const STAGE_LABELS: Record<string, string> = {
+    universe: "取得股票清單",
+    fetch: "下載股價數據",
+    process: "計算技術指標",
+    validate: "執行策略驗證",
+    report: "產生報告",
+};
+
+// 套用後端推送的差異：更新/新增變動列、刪除已移除的股票
+function applyDelta(prev: APIResponse, delta: ResultsDeltaEvent): APIResponse {
+    const removed = new Set(delta.removed);
+    const changed = new Map(delta.changed.map(row => [row.ticker, row]));
+    const rows = prev.data
+        .filter(row => !removed.has(row.ticker))
+        .map(row => changed.get(row.ticker) ?? row);
+    const existing = new Set(prev.data.map(row => row.ticker));
+    const added = delta.changed.filter(row => !existing.has(row.ticker));
+    return { metadata: delta.metadata, data: [...rows, ...added] };
+}
 // const DATA_URL = `${import.meta.env.BASE_URL}results.json`;
 
 function App() {
@@ -22,6 +44,10 @@ function App() {
 
     const [search, setSearch] = useState("");
     const [showPassOnly, setShowPassOnly] = useState(false);
+    const [progress, setProgress] = useState<ProgressEvent | null>(null);
+    // 初始資料載入完成前收到的結果差異先暫存，載入後再依序套用 (null 表示已載入)
+    // 重複套用同一份差異結果不變，不論載入的是更新前或更新後的 results.json 都正確
+    const pendingDeltas = useRef<ResultsDeltaEvent[] | null>([]);
 
     useEffect(() => {
         fetch(DATA_URL)
@@ -29,7 +55,11 @@ function App() {
                 if (!res.ok) throw new Error("無法讀取資料");
                 return res.json();
             })
-            .then(setData)
+            .then((initial: APIResponse) => {
+                const buffered = pendingDeltas.current ?? [];
+                pendingDeltas.current = null;
+                setData(buffered.reduce(applyDelta, initial));
+            })
             .catch(err => {
                 console.error(err);
                 setError("無法載入選股資料，請確認後端是否已執行完畢。");
@@ -37,6 +67,31 @@ function App() {
             .finally(() => setLoading(false));
     }, []);
 
+    // 訂閱後端進度與結果差異，資料更新時不需重新下載整份 results.json
+    useEffect(() => {
+        const source = new EventSource(EVENTS_URL);
+
+        source.addEventListener("status", (e) => {
+            const status: StatusEvent = JSON.parse((e as MessageEvent).data);
+            setProgress(status.running ? status.progress : null);
+        });
+        source.addEventListener("progress", (e) => {
+            const event: ProgressEvent = JSON.parse((e as MessageEvent).data);
+            const finished = event.stage === "done" || event.stage === "failed";
+            setProgress(finished ? null : event);
+        });
+        source.addEventListener("results", (e) => {
+            const delta: ResultsDeltaEvent = JSON.parse((e as MessageEvent).data);
+            if (pendingDeltas.current) {
+                pendingDeltas.current.push(delta);
+                return;
+            }
+            setData(prev => prev ? applyDelta(prev, delta) : prev);
+        });
+
+        return () => source.close();
+    }, []);
+
     if (loading) {
         return (
             <div className="min-h-screen flex items-center justify-center bg-gray-50">
@@ -73,6 +128,16 @@ function App() {
             <Header metadata={data.metadata} />
 
             <main className="max-w-7xl mx-auto px-4 sm:px-6 lg:px-8 mt-8">
+                {progress && (
+                    <div className="flex items-center gap-2 mb-4 px-4 py-2 bg-blue-50 border border-blue-100 rounded-lg text-sm text-blue-700">
+                        <RefreshCw className="animate-spin" size={14} />
+                        <span>
+                            後端更新中：{STAGE_LABELS[progress.stage] ?? progress.stage}
+                            {progress.batch && progress.total ? ` (${progress.batch}/${progress.total})` : ""}
+                        </span>
+                    </div>
+                )}
+
                 <FilterBar 
                     search={search}
                     onSearchChange={setSearch}
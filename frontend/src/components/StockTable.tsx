@@ -80,6 +80,17 @@ function ExpandedRow({ row }: { row: StockData }) {
                         <span className="text-gray-500">目前股價</span>
                         <span className="font-bold text-lg text-gray-900">{formatPrice(price)}</span>
                     </div>
+
+                    {row.industry && (
+                        <div className="col-span-2 flex justify-between items-center text-xs">
+                            <span className="text-gray-500">產業族群：<span className="text-gray-700">{row.industry}</span></span>
+                            <span className="font-mono text-gray-600">
+                                族群 RS {row.group_rs ?? "未排名"}
+                                {row.group_roc != null && ` (${(row.group_roc * 100).toFixed(1)}%)`}
+                                {" "}| 族群內排名 {row.group_rank ?? 0}
+                            </span>
+                        </div>
+                    )}
                     
                     <div className="flex flex-col">
                         <span className="text-xs text-gray-500">50日均線 (季線)</span>
@@ -115,6 +126,17 @@ function ExpandedRow({ row }: { row: StockData }) {
                         </div>
                     </div>
 
+                    {row.vcp && (
+                        <div className="col-span-2 flex justify-between items-center text-xs bg-gray-50 p-2 rounded">
+                            <span className={clsx("font-medium", row.vcp.setup ? "text-amber-600" : "text-gray-500")}>
+                                VCP {row.vcp.contractions}T{row.vcp.setup ? " ✓" : ""}
+                            </span>
+                            <span className="font-mono text-gray-600">
+                                {row.vcp.max_depth_pct}% → {row.vcp.final_depth_pct}% | 量比 {row.vcp.volume_ratio} | 樞紐 {formatPrice(row.vcp.pivot)}
+                            </span>
+                        </div>
+                    )}
+
                     <div className="col-span-2 border-t pt-2 mt-1 grid grid-cols-2 gap-4">
                         <div className="flex flex-col">
                             <span className="text-xs text-gray-500">52週最高</span>
@@ -6,9 +6,25 @@ export interface Config {
     ma_slope_lookback: number;
 }
 
+// 後端 screens/*.json 篩選規格摘要
+export interface ScreenInfo {
+    name: string;
+    description: string;
+    rules: string[];
+}
+
 export interface Metadata {
     timestamp: string;
     config: Config;
+    primary_screen?: string;
+    screens?: ScreenInfo[];
+}
+
+// 非主要篩選規格的判定結果
+export interface ScreenResult {
+    status: "PASS" | "FAIL";
+    score: string;
+    fail_reason: string;
 }
 
 // 新增 Indicators 介面
@@ -21,11 +37,27 @@ export interface Indicators {
     Low_52W: number;
 }
 
+// VCP 波動收縮型態
+export interface VCP {
+    contractions: number;
+    max_depth_pct: number;
+    final_depth_pct: number;
+    pivot: number;
+    volume_ratio: number;
+    volume_dryup: boolean;
+    setup: boolean;
+}
+
 export interface StockData {
     ticker: string;
     name: string;
     price: number;
     rs_rating: number;
+    // 產業族群強度 (舊版 results.json 可能沒有)
+    industry?: string;
+    group_roc?: number | null;  // 族群平均加權漲幅 (Weighted_ROC)，族群未排名時為 null
+    group_rs?: number | null;   // 族群 RS：族群平均加權漲幅在所有族群中的百分位，未排名時為 null
+    group_rank?: number;   // 族群內排名：個股在所屬族群中的百分位
     vol_avg: number;
     status: "PASS" | "FAIL";
     fail_reason: string;
@@ -35,9 +67,31 @@ export interface StockData {
     dist_high_pct: string;
     // 新增此欄位
     indicators: Indicators;
+    vcp?: VCP;
+    screens?: Record<string, ScreenResult>;
 }
 
 export type APIResponse = {
     metadata: Metadata;
     data: StockData[];
-};
\ No newline at end of file
+};
+
+// === 後端 /events (SSE) 推播事件 ===
+export interface ProgressEvent {
+    stage: string;          // universe | fetch | process | validate | report | done | failed
+    time: string;
+    batch?: number;
+    total?: number;
+    message?: string;
+}
+
+export interface StatusEvent {
+    running: boolean;
+    progress: ProgressEvent | null;
+}
+
+export interface ResultsDeltaEvent {
+    metadata: Metadata;
+    changed: StockData[];
+    removed: string[];
+}
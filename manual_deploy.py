@@ -1,5 +1,6 @@
 import os
 import glob
+import shutil
 import subprocess
 import sys
 from datetime import datetime
@@ -8,19 +9,29 @@ from datetime import datetime
 ROOT_DIR = os.getcwd() # 預期在專案根目錄執行
 BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
 CACHE_DIR = os.path.join(BACKEND_DIR, "cache")
+CHECKPOINT_DIR = os.path.join(CACHE_DIR, "runs")
+STORE_FILE = "market_data_store.pkl"   # 跨日累積的歷史資料庫 (增量更新用)
 OUTPUT_FILE = os.path.join(BACKEND_DIR, "output", "results.json")
 MAIN_SCRIPT = os.path.join(BACKEND_DIR, "main.py")
 
-def step_1_clean_cache():
-    """清理 backend/cache 下的所有 .pkl 檔案"""
+def step_1_clean_cache(fresh=False):
+    """
+    清理 backend/cache 下的舊快取
+    預設只刪除非今日的 .pkl 與檢查點，保留歷史資料庫與今日的下載進度 (中斷後重跑可續傳)
+    fresh=True 時全部刪除 (含歷史資料庫)，強制重新下載完整歷史
+    """
     print("\n[Step 1] 🧹 正在清理舊快取...")
     
     if not os.path.exists(CACHE_DIR):
         print("   快取目錄不存在，跳過。")
         return
 
+    today = datetime.now().strftime("%Y-%m-%d")
+
     # 搜尋所有 .pkl 檔案
     files = glob.glob(os.path.join(CACHE_DIR, "*.pkl"))
+    if not fresh:
+        files = [f for f in files if today not in os.path.basename(f) and os.path.basename(f) != STORE_FILE]
     if not files:
         print("   沒有發現舊快取。")
     
@@ -31,6 +42,13 @@ def step_1_clean_cache():
         except Exception as e:
             print(f"   刪除失敗 {f}: {e}")
 
+    # 執行檢查點 (cache/runs/<日期>_<雜湊>/)
+    if os.path.isdir(CHECKPOINT_DIR):
+        for name in os.listdir(CHECKPOINT_DIR):
+            if fresh or not name.startswith(today):
+                shutil.rmtree(os.path.join(CHECKPOINT_DIR, name), ignore_errors=True)
+                print(f"   已刪除檢查點: {name}")
+
 def step_2_run_screener():
     """執行 backend/main.py"""
     print("\n[Step 2] 🚀 正在執行選股程式 (這需要幾分鐘，請耐心等待)...")
@@ -82,7 +100,8 @@ def step_3_git_push():
 if __name__ == "__main__":
     print("=== Minervini 手動部署工具 ===")
     print("此工具將會：清理快取 -> 重跑爬蟲 -> 強制上傳 JSON 到 GitHub")
+    print("(加上 --fresh 會連歷史資料庫與今日檢查點一併刪除，強制重新下載完整歷史)")
     
-    step_1_clean_cache()
+    step_1_clean_cache(fresh="--fresh" in sys.argv)
     step_2_run_screener()
     step_3_git_push()
\ No newline at end of file